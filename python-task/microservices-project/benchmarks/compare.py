@@ -0,0 +1,74 @@
+"""Diff two loadtest.py JSON results, endpoint by endpoint.
+
+    python benchmarks/compare.py before.json after.json
+    python benchmarks/compare.py before.json after.json --fail-above 10
+
+Latency columns show after/before change in percent (negative is faster).
+With --fail-above, exits non-zero when any endpoint's p95 regressed by more
+than that percentage or its error count went up.
+"""
+import sys
+import json
+import argparse
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--fail-above", type=float, help="Max allowed p95 regression in percent")
+    return parser.parse_args()
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    args = parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    for key in ("scenario", "concurrency", "mode"):
+        if before["meta"].get(key) != after["meta"].get(key):
+            print(f"warning: {key} differs ({before['meta'].get(key)} vs {after['meta'].get(key)})", file=sys.stderr)
+
+    header = f"{'endpoint':<22}" + "".join(f"{name:>24}" for name in METRICS) + f"{'errors':>12}"
+    print(header)
+    print("-" * len(header))
+
+    regressions = []
+    endpoints = sorted(set(before["endpoints"]) | set(after["endpoints"]))
+    rows = [(endpoint, before["endpoints"].get(endpoint), after["endpoints"].get(endpoint)) for endpoint in endpoints]
+    rows.append(("TOTAL", before["total"], after["total"]))
+    for endpoint, old, new in rows:
+        if old is None or new is None:
+            print(f"{endpoint:<22}{'only in ' + ('after' if old is None else 'before'):>24}")
+            continue
+        cells = "".join(
+            f"{old[name]:.1f}->{new[name]:.1f} {change(old[name], new[name])}".rjust(24) for name in METRICS
+        )
+        errors = f"{old['errors']}->{new['errors']}"
+        print(f"{endpoint:<22}{cells}{errors:>12}")
+
+        if args.fail_above is not None:
+            if old["p95_ms"] and (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > args.fail_above:
+                regressions.append(f"{endpoint}: p95 {old['p95_ms']:.1f} -> {new['p95_ms']:.1f} ms")
+            if new["errors"] > old["errors"]:
+                regressions.append(f"{endpoint}: errors {old['errors']} -> {new['errors']}")
+
+    if regressions:
+        print("\nRegressions:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""Fixed-concurrency load test of the gateway + user-service + task-service stack.
+
+Drives a request mix through the gateway and reports p50/p95/p99 latency,
+requests per second and errors per endpoint. Results can be written as JSON
+and diffed with compare.py.
+
+By default the three apps run in-process (the gateway reaches the services
+over ASGI transports) against throwaway SQLite databases; client and servers
+then share one event loop, so the numbers measure total CPU cost per request
+rather than network latency. Point --user-db-url/--task-db-url at a local
+Postgres, or --gateway-url at a running stack (e.g. docker-compose behind nginx on :80).
+
+    python benchmarks/loadtest.py --scenario mixed --concurrency 32 --duration 30 --json before.json
+    python benchmarks/loadtest.py --scenario paginate --seed-tasks 5000
+    python benchmarks/loadtest.py --gateway-url http://localhost --scenario crud
+
+Scenarios:
+    auth      register + login bursts (bcrypt-bound)
+    crud      create / list / get / update / delete on each user's own tasks
+    paginate  deep pagination, keyset cursor walk vs large OFFSET
+    mixed     mostly reads with some writes and occasional logins
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import importlib
+import platform
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PASSWORD = "bench-password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before measuring")
+    parser.add_argument("--seed-tasks", type=int, help="Tasks created per user before the run (default depends on scenario)")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--gateway-url", help="Run against a live gateway instead of in-process apps")
+    parser.add_argument("--user-db-url", help="SQLAlchemy async URL for in-process user-service (default: temporary SQLite)")
+    parser.add_argument("--task-db-url", help="SQLAlchemy async URL for in-process task-service (default: temporary SQLite)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra environment for in-process services (repeatable)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the request mix")
+    parser.add_argument("--json", dest="json_path", help="Write results to this file")
+    return parser.parse_args()
+
+
+# In-process stack
+
+def load_service(service: str):
+    """Import <service>/app as a fresh 'app' package, leaving sys.modules clean for the next service"""
+    def purge():
+        for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+            del sys.modules[name]
+
+    purge()
+    sys.path.insert(0, os.path.abspath(os.path.join(ROOT, service)))
+    try:
+        main = importlib.import_module("app.main")
+        modules = {name: module for name, module in sys.modules.items() if name == "app" or name.startswith("app.")}
+    finally:
+        sys.path.pop(0)
+        purge()
+    return main, modules
+
+
+class InProcessStack:
+    def __init__(self, args):
+        tmp = tempfile.mkdtemp(prefix="bench-loadtest-")
+        self.user_db_url = args.user_db_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'users.db')}"
+        self.task_db_url = args.task_db_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'tasks.db')}"
+        os.environ.setdefault("JWT_SECRET_KEY", "loadtest-secret-key")
+        # Every virtual user connects from one address, so the per-IP limit would
+        # reject setup and turn the auth scenario into a measure of 429s; re-enable
+        # with --env RATE_LIMIT_ENABLED=true to benchmark the limiter itself
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        for item in args.env:
+            key, _, value = item.partition("=")
+            os.environ[key] = value
+
+        os.environ["DB_URL"] = self.user_db_url
+        self.user, self.user_modules = load_service("user-service")
+        os.environ["DB_URL"] = self.task_db_url
+        self.task, self.task_modules = load_service("task-service")
+        self.gateway, self.gateway_modules = load_service("gateway-service")
+
+    async def start(self) -> httpx.AsyncBaseTransport:
+        await self.user.app.router.startup()
+        await self.task.app.router.startup()
+        # The gateway's own startup hook would open real HTTP pools; wire ASGI transports instead
+        self.gateway_modules["app.clients"].upstreams.start({
+            "user-service": httpx.ASGITransport(app=self.user.app),
+            "task-service": httpx.ASGITransport(app=self.task.app),
+        })
+        return httpx.ASGITransport(app=self.gateway.app)
+
+    async def stop(self):
+        await self.gateway_modules["app.clients"].upstreams.close()
+        await self.task.app.router.shutdown()
+        await self.user.app.router.shutdown()
+        await self.task_modules["app.database"].engine.dispose()
+        await self.user_modules["app.database"].engine.dispose()
+
+    def describe(self) -> dict:
+        return {"mode": "in-process", "user_db": self.user_db_url.split(":")[0], "task_db": self.task_db_url.split(":")[0]}
+
+
+# Measurement
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    def record(self, endpoint: str, seconds: float, error: Optional[str]):
+        if not self.recording:
+            return
+        self.latencies[endpoint].append(seconds)
+        if error is not None:
+            self.errors[endpoint][error] += 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples: List[float], errors: Dict[str, int], elapsed: float) -> dict:
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "errors": sum(errors.values()),
+        "error_kinds": dict(errors),
+        "rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+# Virtual users and operations
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, run_id: str, index: int, rng: random.Random, page_size: int):
+        self.client = client
+        self.recorder = recorder
+        self.run_id = run_id
+        self.index = index
+        self.rng = rng
+        self.page_size = page_size
+        self.registrations = 0
+        self.username: Optional[str] = None
+        self.headers: Dict[str, str] = {}
+        self.task_ids: List[int] = []
+        self.task_count = 0
+        self.cursor: Optional[str] = None
+
+    async def request(self, endpoint: str, method: str, path: str, expected=(200,), **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(endpoint, time.perf_counter() - started, type(e).__name__)
+            return None
+        error = None if response.status_code in expected else str(response.status_code)
+        self.recorder.record(endpoint, time.perf_counter() - started, error)
+        return response
+
+    def new_username(self) -> str:
+        self.registrations += 1
+        return f"lt{self.run_id}u{self.index}n{self.registrations}"
+
+    async def register(self) -> bool:
+        username = self.new_username()
+        response = await self.request(
+            "POST /register", "POST", "/register",
+            json={"username": username, "email": f"{username}@loadtest.example.com", "password": PASSWORD},
+        )
+        if response is None or response.status_code != 200:
+            return False
+        self.username = username
+        return True
+
+    async def login(self) -> bool:
+        response = await self.request(
+            "POST /login", "POST", "/login", json={"username": self.username, "password": PASSWORD}
+        )
+        if response is None or response.status_code != 200:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return True
+
+    async def seed_tasks(self, count: int):
+        """Create tasks through the batch endpoint (one call per 500 tasks)"""
+        while count > 0:
+            size = min(count, 500)
+            tasks = [{"title": f"seed {self.task_count + i}", "description": "loadtest"} for i in range(size)]
+            response = await self.request(
+                "POST /tasks/batch", "POST", "/tasks/batch", expected=(200, 207), json={"tasks": tasks}, headers=self.headers
+            )
+            if response is None:
+                return
+            for result in response.json().get("results", []):
+                if result.get("id") is not None:
+                    self.task_ids.append(result["id"])
+            self.task_count += size
+            count -= size
+
+
+async def op_register_login(user: VirtualUser):
+    if await user.register():
+        await user.login()
+
+
+async def op_login(user: VirtualUser):
+    await user.login()
+
+
+async def op_create(user: VirtualUser):
+    user.task_count += 1
+    response = await user.request(
+        "POST /tasks", "POST", "/tasks",
+        json={"title": f"task {user.task_count}", "description": "loadtest"}, headers=user.headers,
+    )
+    if response is not None and response.status_code == 200:
+        user.task_ids.append(response.json()["id"])
+
+
+async def op_list(user: VirtualUser):
+    await user.request("GET /tasks", "GET", "/tasks", params={"limit": user.page_size}, headers=user.headers)
+
+
+async def op_get(user: VirtualUser):
+    if not user.task_ids:
+        return await op_create(user)
+    task_id = user.rng.choice(user.task_ids)
+    await user.request("GET /tasks/{id}", "GET", f"/tasks/{task_id}", headers=user.headers)
+
+
+async def op_update(user: VirtualUser):
+    if not user.task_ids:
+        return await op_create(user)
+    task_id = user.rng.choice(user.task_ids)
+    await user.request(
+        "PUT /tasks/{id}", "PUT", f"/tasks/{task_id}",
+        json={"completed": user.rng.random() < 0.5}, headers=user.headers,
+    )
+
+
+async def op_delete(user: VirtualUser):
+    if len(user.task_ids) < 2:
+        return await op_create(user)
+    task_id = user.task_ids.pop(user.rng.randrange(len(user.task_ids)))
+    await user.request("DELETE /tasks/{id}", "DELETE", f"/tasks/{task_id}", headers=user.headers)
+
+
+async def op_page_cursor(user: VirtualUser):
+    """Next page of a keyset walk over all of the user's tasks, restarting at the end"""
+    params = {"limit": user.page_size}
+    if user.cursor:
+        params["cursor"] = user.cursor
+    response = await user.request("GET /tasks?cursor", "GET", "/tasks", params=params, headers=user.headers)
+    user.cursor = response.headers.get("x-next-cursor") if response is not None else None
+
+
+async def op_page_offset(user: VirtualUser):
+    """A page at a random depth in the back half of the user's tasks, via OFFSET"""
+    depth = user.rng.randrange(user.task_count // 2, max(user.task_count - user.page_size, user.task_count // 2 + 1))
+    await user.request(
+        "GET /tasks?skip", "GET", "/tasks", params={"skip": depth, "limit": user.page_size}, headers=user.headers
+    )
+
+
+# name -> (weighted operations, default tasks seeded per user)
+SCENARIOS = {
+    "auth": ([(op_register_login, 3), (op_login, 1)], 0),
+    "crud": ([(op_create, 3), (op_list, 3), (op_get, 4), (op_update, 2), (op_delete, 1)], 20),
+    "paginate": ([(op_page_cursor, 1), (op_page_offset, 1)], 2000),
+    "mixed": ([(op_list, 6), (op_get, 6), (op_page_cursor, 2), (op_create, 2), (op_update, 2), (op_delete, 1), (op_login, 1)], 200),
+}
+
+
+async def run_user(user: VirtualUser, operations, weights, deadline: float):
+    while time.perf_counter() < deadline:
+        operation = user.rng.choices(operations, weights)[0]
+        await operation(user)
+
+
+async def run(args) -> dict:
+    operations, default_seed = SCENARIOS[args.scenario]
+    seed_tasks = default_seed if args.seed_tasks is None else args.seed_tasks
+    ops, weights = zip(*operations)
+    run_id = uuid.uuid4().hex[:8]
+    recorder = Recorder()
+
+    stack = None
+    if args.gateway_url:
+        transport = None
+        base_url = args.gateway_url
+        environment = {"mode": "remote", "gateway_url": args.gateway_url}
+    else:
+        stack = InProcessStack(args)
+        transport = await stack.start()
+        base_url = "http://gateway"
+        environment = stack.describe()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=60.0) as client:
+            users = [
+                VirtualUser(client, recorder, run_id, i, random.Random(args.seed + i), args.page_size)
+                for i in range(args.concurrency)
+            ]
+            print(f"Setting up {len(users)} users ({seed_tasks} tasks each)...", file=sys.stderr)
+            for user in users:
+                if not (await user.register() and await user.login()):
+                    raise SystemExit("Could not register/login a load-test user; is the stack up?")
+            await asyncio.gather(*(user.seed_tasks(seed_tasks) for user in users))
+
+            print(f"Running '{args.scenario}' for {args.warmup:.0f}s warmup + {args.duration:.0f}s...", file=sys.stderr)
+            start = time.perf_counter()
+            warmup_end = start + args.warmup
+            deadline = warmup_end + args.duration
+            workers = [asyncio.create_task(run_user(user, ops, weights, deadline)) for user in users]
+            await asyncio.sleep(max(warmup_end - time.perf_counter(), 0))
+            recorder.recording = True
+            measured_start = time.perf_counter()
+            await asyncio.gather(*workers)
+            elapsed = time.perf_counter() - measured_start
+    finally:
+        if stack is not None:
+            await stack.stop()
+
+    all_samples = [sample for samples in recorder.latencies.values() for sample in samples]
+    all_errors: Dict[str, int] = defaultdict(int)
+    for errors in recorder.errors.values():
+        for kind, count in errors.items():
+            all_errors[kind] += count
+
+    return {
+        "meta": {
+            "scenario": args.scenario,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 3),
+            "warmup_s": args.warmup,
+            "seed_tasks": seed_tasks,
+            "page_size": args.page_size,
+            "python": platform.python_version(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            **environment,
+        },
+        "total": summarize(all_samples, all_errors, elapsed),
+        "endpoints": {
+            endpoint: summarize(samples, recorder.errors.get(endpoint, {}), elapsed)
+            for endpoint, samples in sorted(recorder.latencies.items())
+        },
+    }
+
+
+def print_report(results: dict):
+    header = f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(results["endpoints"].items()) + [("TOTAL", results["total"])]
+    for endpoint, stats in rows:
+        print(
+            f"{endpoint:<22}{stats['requests']:>9}{stats['errors']:>8}{stats['rps']:>10.1f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        )
+
+
+def main():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
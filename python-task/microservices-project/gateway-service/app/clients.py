@@ -0,0 +1,335 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+import httpx
+
+from .metrics import registry
+from .resilience import CircuitBreaker, RetryBudget
+
+logger = logging.getLogger(__name__)
+
+# Service URLs from environment; each may list several instances, comma-separated
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8000")
+TASK_SERVICE_URL = os.getenv("TASK_SERVICE_URL", "http://localhost:8001")
+
+# Timeout settings (seconds)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30.0"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5.0"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5.0"))
+USER_SERVICE_TIMEOUT = float(os.getenv("USER_SERVICE_TIMEOUT", str(HTTP_TIMEOUT)))
+TASK_SERVICE_TIMEOUT = float(os.getenv("TASK_SERVICE_TIMEOUT", str(HTTP_TIMEOUT)))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5.0"))
+
+# Connection pool settings (per upstream instance)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30.0"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Active health checking of upstream instances
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5.0"))
+# Cached results older than this mean the checker has stalled (default: three intervals)
+HEALTH_CHECK_STALE_AFTER = float(os.getenv("HEALTH_CHECK_STALE_AFTER", str(HEALTH_CHECK_INTERVAL * 3)))
+# Consecutive probe results needed to take an instance out of / back into rotation
+HEALTH_CHECK_UNHEALTHY_THRESHOLD = int(os.getenv("HEALTH_CHECK_UNHEALTHY_THRESHOLD", "2"))
+HEALTH_CHECK_HEALTHY_THRESHOLD = int(os.getenv("HEALTH_CHECK_HEALTHY_THRESHOLD", "1"))
+# Smoothing factor for the probe latency average that weights instance selection
+HEALTH_LATENCY_EWMA_ALPHA = float(os.getenv("HEALTH_LATENCY_EWMA_ALPHA", "0.3"))
+
+USER_SERVICE = "user-service"
+TASK_SERVICE = "task-service"
+
+
+def _split_urls(value: str) -> List[str]:
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+UPSTREAMS = {
+    USER_SERVICE: {"urls": _split_urls(USER_SERVICE_URL), "timeout": USER_SERVICE_TIMEOUT},
+    TASK_SERVICE: {"urls": _split_urls(TASK_SERVICE_URL), "timeout": TASK_SERVICE_TIMEOUT},
+}
+
+
+class Endpoint:
+    """One upstream instance: its pooled client, in-flight count, health and circuit breaker"""
+
+    def __init__(self, upstream: str, url: str, client: httpx.AsyncClient):
+        self.upstream = upstream
+        self.url = url
+        self.client = client
+        self.breaker = CircuitBreaker(f"{upstream} {url}")
+        self.outstanding = 0
+        self.healthy = True
+        self.latency_ewma: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._successes = 0
+        self._failures = 0
+
+    def load(self) -> float:
+        """Selection cost: in-flight requests scaled by the instance's recent probe latency"""
+        return (self.outstanding + 1) * (self.latency_ewma or 0.001)
+
+    def record_probe(self, ok: bool, latency: float, error: Optional[str] = None):
+        self.last_checked = time.time()
+        self.last_error = error
+        if ok:
+            self._successes += 1
+            self._failures = 0
+            alpha = HEALTH_LATENCY_EWMA_ALPHA
+            self.latency_ewma = latency if self.latency_ewma is None else alpha * latency + (1 - alpha) * self.latency_ewma
+            if not self.healthy and self._successes >= HEALTH_CHECK_HEALTHY_THRESHOLD:
+                self.healthy = True
+                logger.info("Upstream instance back in rotation: %s %s", self.upstream, self.url)
+        else:
+            self._failures += 1
+            self._successes = 0
+            if self.healthy and self._failures >= HEALTH_CHECK_UNHEALTHY_THRESHOLD:
+                self.healthy = False
+                logger.warning("Upstream instance out of rotation: %s %s (%s)", self.upstream, self.url, error)
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency_ms": round(self.latency_ewma * 1000, 3) if self.latency_ewma is not None else None,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+            "circuit": self.breaker.snapshot(),
+        }
+
+
+class Upstream:
+    """The instances of one upstream service and the policy for choosing between them"""
+
+    def __init__(self, name: str, endpoints: List[Endpoint]):
+        self.name = name
+        self.endpoints = endpoints
+        self.retry_budget = RetryBudget()
+
+    def pick(self, exclude: Iterable[Endpoint] = ()) -> Optional[Endpoint]:
+        """Power-of-two-choices over healthy instances with a closed circuit, preferring lower load.
+
+        An instance whose open circuit is due for a half-open probe gets the call
+        first. Instances in exclude (already tried) are used only if nothing else
+        is healthy, and if health checks have failed every instance, all closed-circuit
+        instances are used. None when nothing may be tried.
+        """
+        excluded = set(exclude)
+        for endpoint in self.endpoints:
+            if endpoint.breaker.state != CircuitBreaker.CLOSED and endpoint not in excluded and endpoint.breaker.allow():
+                return endpoint
+
+        closed = [e for e in self.endpoints if e.breaker.state == CircuitBreaker.CLOSED]
+        healthy = [e for e in closed if e.healthy]
+        candidates = (
+            [e for e in healthy if e not in excluded] or healthy
+            or [e for e in closed if e not in excluded] or closed
+        )
+        if len(candidates) == 1:
+            return candidates[0]
+        if candidates:
+            first, second = random.sample(candidates, 2)
+            return first if first.load() <= second.load() else second
+        return None
+
+    def retry_after(self) -> float:
+        """Seconds until some instance's circuit lets a call through"""
+        return min((e.breaker.retry_after() for e in self.endpoints), default=0.0)
+
+    def healthy(self) -> bool:
+        return any(e.healthy and e.breaker.state != CircuitBreaker.OPEN for e in self.endpoints)
+
+
+class UpstreamClients:
+    """Long-lived pooled HTTP clients, one per upstream instance, plus their health checker"""
+
+    def __init__(self):
+        self._upstreams: Dict[str, Upstream] = {}
+        self._health_task: Optional[asyncio.Task] = None
+        # Wall-clock time the last full round of instance probes finished
+        self.last_check_at: Optional[float] = None
+
+    def start(self, transports: Optional[Dict[str, httpx.AsyncBaseTransport]] = None, health_checks: bool = True):
+        """Create one client per upstream instance; call once at application startup"""
+        transports = transports or {}
+        limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        for name, upstream in UPSTREAMS.items():
+            timeout = httpx.Timeout(
+                upstream["timeout"],
+                connect=min(HTTP_CONNECT_TIMEOUT, upstream["timeout"]),
+                pool=HTTP_POOL_TIMEOUT,
+            )
+            endpoints = []
+            for url in upstream["urls"]:
+                client = httpx.AsyncClient(
+                    base_url=url,
+                    limits=limits,
+                    timeout=timeout,
+                    http2=HTTP2_ENABLED,
+                    transport=transports.get(name),
+                )
+                endpoints.append(Endpoint(name, url, client))
+                logger.info(
+                    "Upstream client ready: %s -> %s (http2=%s, max_connections=%s)",
+                    name, url, HTTP2_ENABLED, HTTP_MAX_CONNECTIONS
+                )
+            self._upstreams[name] = Upstream(name, endpoints)
+
+        if health_checks and HEALTH_CHECK_INTERVAL > 0:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def close(self):
+        """Stop health checks and close all clients and their pooled connections; call at shutdown"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for name, upstream in self._upstreams.items():
+            for endpoint in upstream.endpoints:
+                await endpoint.client.aclose()
+            logger.info("Upstream clients closed: %s", name)
+        self._upstreams.clear()
+
+    def get(self, name: str) -> Upstream:
+        """Return the instances of an upstream"""
+        return self._upstreams[name]
+
+    def names(self) -> List[str]:
+        return list(self._upstreams)
+
+    async def _probe(self, endpoint: Endpoint):
+        started = time.perf_counter()
+        try:
+            # Bound the whole probe, not just each network operation, so one hung
+            # instance cannot hold up a round of checks
+            response = await asyncio.wait_for(
+                endpoint.client.get("/health", timeout=HEALTH_CHECK_TIMEOUT), HEALTH_CHECK_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            endpoint.record_probe(False, time.perf_counter() - started, "timed out")
+            return
+        except httpx.RequestError as e:
+            endpoint.record_probe(False, time.perf_counter() - started, f"{type(e).__name__}: {str(e)}")
+            return
+        latency = time.perf_counter() - started
+        if response.status_code == 200:
+            endpoint.record_probe(True, latency)
+        else:
+            endpoint.record_probe(False, latency, f"HTTP {response.status_code}")
+
+    async def check(self, name: Optional[str] = None):
+        """Probe /health on every instance (of one upstream, or all) concurrently"""
+        names = [name] if name is not None else list(self._upstreams)
+        await asyncio.gather(*(
+            self._probe(endpoint) for upstream in names for endpoint in self._upstreams[upstream].endpoints
+        ))
+        if name is None:
+            self.last_check_at = time.time()
+
+    @property
+    def health_checks_enabled(self) -> bool:
+        return self._health_task is not None
+
+    def health_is_stale(self) -> bool:
+        """Whether background checks are enabled but have not completed a round recently"""
+        if not self.health_checks_enabled:
+            return False
+        return self.last_check_at is None or time.time() - self.last_check_at > HEALTH_CHECK_STALE_AFTER
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error("Upstream health check error: %s", e)
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    def endpoint_states(self) -> Dict[str, List[dict]]:
+        """Health, load and circuit state of every upstream instance"""
+        return {name: [e.snapshot() for e in upstream.endpoints] for name, upstream in self._upstreams.items()}
+
+    def pool_stats(self) -> dict:
+        """Report active, idle and waiting connections for each upstream instance's pool"""
+        return {
+            name: {e.url: _pool_stats(e.client) for e in upstream.endpoints}
+            for name, upstream in self._upstreams.items()
+        }
+
+
+def _pool_stats(client: httpx.AsyncClient) -> dict:
+    """Inspect the httpcore connection pool behind an httpx client"""
+    pool = getattr(client._transport, "_pool", None)
+    if pool is None:
+        # Custom transports (e.g. in-process ASGI) have no connection pool
+        return {"active": 0, "idle": 0, "waiting": 0}
+
+    connections = list(pool.connections)
+    idle = sum(1 for connection in connections if connection.is_idle())
+    waiting = sum(1 for request in list(pool._requests) if request.is_queued())
+    return {
+        "active": len(connections) - idle,
+        "idle": idle,
+        "waiting": waiting,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    }
+
+
+upstreams = UpstreamClients()
+
+
+def _pool_samples() -> dict:
+    return {
+        (name, url, state): stats[state]
+        for name, endpoints in upstreams.pool_stats().items()
+        for url, stats in endpoints.items()
+        for state in ("active", "idle", "waiting")
+    }
+
+
+def _endpoint_samples(value) -> dict:
+    return {
+        (name, endpoint["url"]): value(endpoint)
+        for name, endpoints in upstreams.endpoint_states().items()
+        for endpoint in endpoints
+    }
+
+
+_CIRCUIT_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+registry.callback(
+    "gateway_upstream_pool_connections",
+    "Upstream HTTP connection pool state",
+    ("upstream", "endpoint", "state"),
+    _pool_samples,
+)
+registry.callback(
+    "gateway_upstream_endpoint_healthy",
+    "Whether an upstream instance passes active health checks",
+    ("upstream", "endpoint"),
+    lambda: _endpoint_samples(lambda endpoint: int(endpoint["healthy"])),
+)
+registry.callback(
+    "gateway_upstream_endpoint_outstanding",
+    "Requests awaiting a response from an upstream instance",
+    ("upstream", "endpoint"),
+    lambda: _endpoint_samples(lambda endpoint: endpoint["outstanding"]),
+)
+registry.callback(
+    "gateway_circuit_state",
+    "Upstream instance circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ("upstream", "endpoint"),
+    lambda: _endpoint_samples(lambda endpoint: _CIRCUIT_STATE_VALUES[endpoint["circuit"]["state"]]),
+)
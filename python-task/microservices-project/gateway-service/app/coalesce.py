@@ -0,0 +1,205 @@
+import os
+import asyncio
+import logging
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from .metrics import registry
+from .proxy import add_background
+
+logger = logging.getLogger(__name__)
+
+# Request coalescing settings
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Longest a follower waits on the shared upstream call before making its own
+COALESCE_MAX_WAIT = float(os.getenv("COALESCE_MAX_WAIT", "5.0"))
+# Larger responses are streamed to the leader only; followers then make their own call
+COALESCE_MAX_BODY_BYTES = int(os.getenv("COALESCE_MAX_BODY_BYTES", str(1024 * 1024)))
+
+# Request headers that can change the upstream response for the same user, path and query
+VARY_HEADERS = ("accept", "accept-encoding")
+# Conditional and range requests get answers tailored to the caller's own cached
+# copy (e.g. a bodiless 304), so they never share a call
+UNCOALESCIBLE_HEADERS = ("if-none-match", "if-modified-since", "if-match", "if-unmodified-since", "if-range", "range")
+
+# Response headers describing the leader's own request; a follower's response gets
+# its own X-Request-Id from the logging middleware and its own gateway Server-Timing
+PER_REQUEST_HEADERS = frozenset({b"x-request-id", b"server-timing"})
+
+# Outcomes shared with followers: (status, raw headers, body), an exception, or None to fall back
+SharedResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+COALESCED_REQUESTS = registry.counter(
+    "gateway_coalesced_requests_total",
+    "Coalescible GETs by role: leader (made the upstream call), follower (shared it), fallback (made its own)",
+    ("role",),
+)
+
+
+def _buffered_response(shared: SharedResponse, follower: bool = False) -> Response:
+    status_code, raw_headers, body = shared
+    response = Response(content=body, status_code=status_code)
+    response.raw_headers = [
+        (name, value)
+        for name, value in raw_headers
+        if not (follower and name.lower() in PER_REQUEST_HEADERS)
+    ]
+    return response
+
+
+def _with_length(raw_headers: List[Tuple[bytes, bytes]], body: bytes) -> List[Tuple[bytes, bytes]]:
+    # The relayed headers describe the raw bytes, so only the framing changes
+    headers = [(name, value) for name, value in raw_headers if name.lower() != b"content-length"]
+    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    return headers
+
+
+class _Flight:
+    """One leader's upstream call: the outcome followers wait on, and whether any joined"""
+    __slots__ = ("outcome", "followers")
+
+    def __init__(self):
+        self.outcome: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+
+def coalescible(request: Request) -> bool:
+    """Whether a GET may share its upstream call: it must not be conditional or partial"""
+    return not any(name in request.headers for name in UNCOALESCIBLE_HEADERS)
+
+
+class Coalescer:
+    """Single-flight for identical concurrent GETs.
+
+    The first request for a key (the leader) makes the upstream call; requests
+    arriving with the same key while it is in flight (followers) wait for a copy
+    of its status, headers and bytes instead of making a call of their own.
+    Errors are shared the same way. If no follower has joined by the time the
+    upstream headers arrive, the leader's response is streamed straight through
+    and the key is released; otherwise the body is teed to the leader's client
+    and, up to max_body_bytes, kept for the followers. A follower that waits
+    longer than max_wait, or whose leader goes away or gets an oversized body,
+    falls back to its own upstream call. Nothing is ever served from a
+    previous call.
+    """
+
+    def __init__(self, max_wait: float = COALESCE_MAX_WAIT, max_body_bytes: int = COALESCE_MAX_BODY_BYTES):
+        self.max_wait = max_wait
+        self.max_body_bytes = max_body_bytes
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.fallbacks = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Response]]) -> Response:
+        """Return call()'s response, sharing one call among concurrent requests with the same key"""
+        flight = self._flights.get(key)
+        if flight is None:
+            return await self._lead(key, call)
+
+        flight.followers += 1
+        try:
+            shared = await asyncio.wait_for(asyncio.shield(flight.outcome), self.max_wait)
+        except asyncio.TimeoutError:
+            shared = None
+        if shared is None:
+            self.fallbacks += 1
+            COALESCED_REQUESTS.inc("fallback")
+            return await call()
+
+        self.followers += 1
+        COALESCED_REQUESTS.inc("follower")
+        if isinstance(shared, Exception):
+            raise shared
+        return _buffered_response(shared, follower=True)
+
+    def _finish(self, key: Hashable, flight: _Flight, shared: Optional[object]):
+        """Settle a flight (None sends followers to their own calls) and release its key"""
+        if not flight.outcome.done():
+            flight.outcome.set_result(shared)
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def _lead(self, key: Hashable, call: Callable[[], Awaitable[Response]]) -> Response:
+        flight = _Flight()
+        self._flights[key] = flight
+        self.leaders += 1
+        COALESCED_REQUESTS.inc("leader")
+        try:
+            response = await call()
+        except HTTPException as e:
+            self._finish(key, flight, e)
+            raise
+        except BaseException:
+            # Cancelled or failed unexpectedly: let followers make their own calls
+            self._finish(key, flight, None)
+            raise
+
+        if not isinstance(response, StreamingResponse):
+            self._finish(key, flight, (response.status_code, list(response.raw_headers), response.body))
+            return response
+        if flight.followers == 0:
+            # Nobody to share with: stream it through untouched; later requests lead their own calls
+            self._finish(key, flight, None)
+            return response
+
+        raw_headers = list(response.raw_headers)
+        response.body_iterator = self._tee(key, flight, response.status_code, raw_headers, response.body_iterator)
+        # Settles the flight even if the leader's client leaves before the body starts
+        add_background(response, partial(self._settle, key, flight))
+        return response
+
+    async def _settle(self, key: Hashable, flight: _Flight):
+        self._finish(key, flight, None)
+
+    async def _tee(
+        self,
+        key: Hashable,
+        flight: _Flight,
+        status_code: int,
+        raw_headers: List[Tuple[bytes, bytes]],
+        body: AsyncIterator[bytes],
+    ) -> AsyncIterator[bytes]:
+        """Relay the leader's body, keeping a copy for followers while it fits in max_body_bytes"""
+        chunks: Optional[List[bytes]] = []
+        size = 0
+        try:
+            async for chunk in body:
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > self.max_body_bytes:
+                        # Too large to share: followers fall back now rather than waiting for the end
+                        chunks = None
+                        self._finish(key, flight, None)
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+            if chunks is not None:
+                shared = b"".join(chunks)
+                self._finish(key, flight, (status_code, _with_length(raw_headers, shared), shared))
+        except httpx.RequestError as e:
+            logger.error("Upstream response interrupted while coalescing: %s", e)
+            raise
+        finally:
+            self._finish(key, flight, None)
+
+    def stats(self) -> dict:
+        total = self.leaders + self.followers + self.fallbacks
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "fallbacks": self.fallbacks,
+            "coalesced_ratio": self.followers / total if total else 0.0,
+        }
+
+
+coalescer = Coalescer()
+
+registry.callback(
+    "gateway_coalesce_in_flight", "Distinct coalescible requests currently in flight", (), lambda: {(): len(coalescer._flights)}
+)
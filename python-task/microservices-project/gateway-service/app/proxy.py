@@ -0,0 +1,235 @@
+import math
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+import httpx
+from fastapi import Request, HTTPException, status
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTasks
+
+from .clients import upstreams, UPSTREAMS, HTTP_CONNECT_TIMEOUT, HTTP_POOL_TIMEOUT
+from .metrics import registry
+from .resilience import backoff_delay, is_load_shed, IDEMPOTENT_METHODS, FAILURE_STATUSES, RETRY_MAX_RETRIES
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_LATENCY = registry.histogram(
+    "gateway_upstream_request_duration_seconds",
+    "Time from sending an upstream request to receiving its response headers",
+    ("upstream", "status"),
+)
+UPSTREAM_ERRORS = registry.counter(
+    "gateway_upstream_errors_total", "Upstream requests that failed before a response", ("upstream",)
+)
+UPSTREAM_RETRIES = registry.counter("gateway_upstream_retries_total", "Upstream request retries", ("upstream",))
+UPSTREAM_REJECTED = registry.counter(
+    "gateway_upstream_rejected_total", "Requests failed fast because the upstream circuit was open", ("upstream",)
+)
+
+# Remaining time budget in milliseconds, accepted from callers and sent to upstreams
+DEADLINE_HEADER = "x-request-timeout"
+
+# Connection-scoped headers that must not be relayed by a proxy (RFC 9110 7.6.1)
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+})
+
+# Request headers the gateway always sets itself
+GATEWAY_MANAGED_HEADERS = frozenset({"host", "x-user-id", "x-request-id", tracing.TRACEPARENT_HEADER, DEADLINE_HEADER})
+
+_EXCLUDED_REQUEST_HEADERS = HOP_BY_HOP_HEADERS | GATEWAY_MANAGED_HEADERS
+
+
+def _request_has_body(request: Request) -> bool:
+    """Whether the incoming request carries a body that must be streamed upstream"""
+    headers = request.headers
+    if "transfer-encoding" in headers:
+        return True
+    return headers.get("content-length", "0") not in ("", "0")
+
+
+def _upstream_label(upstream: str) -> str:
+    return upstream.replace("-", " ").capitalize()
+
+
+async def _relay(response: httpx.Response) -> AsyncIterator[bytes]:
+    """Yield upstream body chunks as received, releasing the connection afterwards"""
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+    finally:
+        await response.aclose()
+
+
+def add_background(response: Response, func: Callable[[], Awaitable[None]]):
+    """Run func after the response is sent, alongside any background work already attached"""
+    tasks = BackgroundTasks()
+    if response.background is not None:
+        tasks.add_task(response.background)
+    tasks.add_task(func)
+    response.background = tasks
+
+
+def _deadline_budget(request: Request, upstream: str, timeout: Optional[float]) -> float:
+    """Seconds this request may spend upstream: the route or upstream timeout, shortened by the caller's"""
+    budget = timeout if timeout is not None else UPSTREAMS[upstream]["timeout"]
+    caller_ms = request.headers.get(DEADLINE_HEADER)
+    if caller_ms:
+        try:
+            budget = min(budget, max(int(caller_ms), 0) / 1000)
+        except ValueError:
+            pass
+    return budget
+
+
+def _attempt_timeout(remaining: float) -> httpx.Timeout:
+    return httpx.Timeout(
+        remaining,
+        connect=min(HTTP_CONNECT_TIMEOUT, remaining),
+        pool=min(HTTP_POOL_TIMEOUT, remaining),
+    )
+
+
+async def forward(
+    request: Request,
+    upstream: str,
+    path: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> StreamingResponse:
+    """Stream a request to an upstream and its response back without decoding either body.
+
+    Each attempt goes to an instance picked by the upstream's balancer, skipping
+    open circuits; attempts share one deadline, and idempotent requests without
+    a body are retried on another instance within the retry budget.
+    """
+    pool = upstreams.get(upstream)
+    budget = pool.retry_budget
+    deadline = time.monotonic() + _deadline_budget(request, upstream, timeout)
+    has_body = _request_has_body(request)
+    retryable = request.method in IDEMPOTENT_METHODS and not has_body
+
+    outgoing = [
+        (name, value)
+        for name, value in request.headers.raw
+        if name.decode("latin-1").lower() not in _EXCLUDED_REQUEST_HEADERS
+    ]
+    upstream_span = tracing.span(f"upstream {upstream}", **{"http.method": request.method, "peer.service": upstream})
+    headers = tracing.inject(dict(headers or {}), upstream_span)
+    outgoing.extend((name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items())
+
+    url = path
+    if request.url.query:
+        url += f"?{request.url.query}"
+
+    budget.record_request()
+    attempt = 0
+    tried = []
+    while True:
+        endpoint = pool.pick(exclude=tried)
+        if endpoint is None:
+            UPSTREAM_REJECTED.inc(upstream)
+            upstream_span.end(HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "circuit open"))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{_upstream_label(upstream)} unavailable",
+                headers={"Retry-After": str(max(math.ceil(pool.retry_after()), 1))}
+            )
+        tried.append(endpoint)
+        breaker = endpoint.breaker
+        client = endpoint.client
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            upstream_span.end(HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, "deadline exceeded"))
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=f"{_upstream_label(upstream)} timed out"
+            )
+
+        upstream_request = client.build_request(
+            request.method,
+            url,
+            headers=outgoing + [(DEADLINE_HEADER.encode("latin-1"), str(int(remaining * 1000)).encode("latin-1"))],
+            content=request.stream() if has_body else None,
+            timeout=_attempt_timeout(remaining),
+        )
+
+        started = time.perf_counter()
+        upstream_response = None
+        endpoint.outstanding += 1
+        try:
+            upstream_response = await client.send(upstream_request, stream=True)
+        except httpx.RequestError as e:
+            breaker.record_failure()
+            UPSTREAM_ERRORS.inc(upstream)
+            logger.error(
+                "Error forwarding %s %s to %s at %s (attempt %s): %s",
+                request.method, path, upstream, endpoint.url, attempt + 1, e
+            )
+            error = e
+        finally:
+            endpoint.outstanding -= 1
+
+        if upstream_response is not None:
+            status_code = upstream_response.status_code
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, upstream, f"{status_code // 100}xx")
+            if is_load_shed(status_code, upstream_response.headers):
+                break
+            if status_code in FAILURE_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+                break
+
+        # Retry only when it is safe, the budget allows it and the backoff fits in the deadline
+        delay = backoff_delay(attempt)
+        if not (
+            retryable
+            and attempt < RETRY_MAX_RETRIES
+            and time.monotonic() + delay < deadline
+            and budget.try_acquire()
+        ):
+            if upstream_response is not None:
+                break
+            upstream_span.end(error)
+            if isinstance(error, httpx.TimeoutException):
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail=f"{_upstream_label(upstream)} timed out"
+                )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{_upstream_label(upstream)} unavailable"
+            )
+
+        if upstream_response is not None:
+            await upstream_response.aclose()
+        UPSTREAM_RETRIES.inc(upstream)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    upstream_span.set_attribute("http.status_code", upstream_response.status_code)
+    upstream_span.set_attribute("retries", attempt)
+    upstream_span.set_attribute("peer.url", endpoint.url)
+    upstream_span.end()
+
+    response = StreamingResponse(_relay(upstream_response), status_code=upstream_response.status_code)
+    # Replace rather than merge so repeated headers (e.g. Set-Cookie) and the
+    # upstream Content-Length/Content-Encoding of the raw bytes are kept as-is
+    response.raw_headers = [
+        (name, value)
+        for name, value in upstream_response.headers.raw
+        if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+    ]
+    return response
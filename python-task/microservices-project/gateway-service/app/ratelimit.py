@@ -0,0 +1,305 @@
+import os
+import math
+import time
+import logging
+import ipaddress
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from .metrics import registry
+from .proxy import add_background
+
+logger = logging.getLogger(__name__)
+
+# Rate limiting settings
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | redis
+# Token buckets: sustained requests per second and burst size
+RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "20"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "40"))
+RATE_LIMIT_IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", "1"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "10"))
+# Concurrent upstream requests allowed per user; 0 disables the cap
+RATE_LIMIT_MAX_IN_FLIGHT = int(os.getenv("RATE_LIMIT_MAX_IN_FLIGHT", "20"))
+# Upper bound on tracked keys in the memory backend
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_KEY_PREFIX = os.getenv("RATE_LIMIT_KEY_PREFIX", "gateway:rl")
+# Peers allowed to report the client address via X-Forwarded-For / X-Real-IP; list only
+# the reverse proxy's own address (e.g. nginx), since any peer matching it can pick its bucket
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "127.0.0.1/32,::1/128")
+
+# Policies: name -> (rate per second, burst)
+POLICIES: Dict[str, Tuple[float, float]] = {
+    "user": (RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST),
+    "ip": (RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST),
+}
+
+RATE_LIMITED = registry.counter(
+    "gateway_rate_limited_total", "Requests rejected with 429 before reaching an upstream", ("policy", "reason")
+)
+
+
+class RateLimited(Exception):
+    """Raised when a request exceeds its rate or concurrency quota"""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(math.ceil(self.retry_after), 1))
+
+
+class MemoryBackend:
+    """Per-process token buckets and in-flight counters.
+
+    Buckets are kept in least-recently-used order; a bucket untouched for long
+    enough to refill completely is indistinguishable from a new one, so expiry
+    just pops such buckets off the old end on each call (amortized O(1)).
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [tokens, updated_at, expires_at]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._in_flight: Dict[str, int] = {}
+
+    def _expire(self, now: float):
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[2] > now and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """Spend one token; returns 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        self._expire(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = burst
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            self._buckets.move_to_end(key)
+
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = [tokens, now, now + (burst - tokens) / rate]
+        return wait
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        count = self._in_flight.get(key, 0)
+        if count >= limit:
+            return False
+        self._in_flight[key] = count + 1
+        return True
+
+    async def release(self, key: str):
+        count = self._in_flight.get(key, 0) - 1
+        if count > 0:
+            self._in_flight[key] = count
+        else:
+            self._in_flight.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+# KEYS[1] bucket; ARGV: rate, burst. Uses the Redis clock so replicas agree on time.
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+  tokens = burst
+else
+  tokens = math.min(burst, tokens + (now - tonumber(state[2])) * rate)
+end
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+# KEYS[1] counter; ARGV: limit, ttl seconds. The TTL bounds leaks from replicas that die mid-request.
+_ACQUIRE_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+if count > tonumber(ARGV[1]) then
+  redis.call('DECR', KEYS[1])
+  return 0
+end
+return 1
+"""
+
+
+class RedisBackend:
+    """Shared buckets and in-flight counters for several gateway replicas"""
+
+    def __init__(self, client=None, url: str = REDIS_URL, prefix: str = RATE_LIMIT_KEY_PREFIX, in_flight_ttl: int = 60):
+        if client is None:
+            # Optional dependency, only needed when RATE_LIMIT_BACKEND=redis
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self.prefix = prefix
+        self.in_flight_ttl = in_flight_ttl
+        self._take = client.register_script(_TAKE_SCRIPT)
+        self._acquire = client.register_script(_ACQUIRE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return float(await self._take(keys=[f"{self.prefix}:b:{key}"], args=[rate, burst]))
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        return bool(await self._acquire(keys=[f"{self.prefix}:f:{key}"], args=[limit, self.in_flight_ttl]))
+
+    async def release(self, key: str):
+        await self._client.decr(f"{self.prefix}:f:{key}")
+
+    def size(self) -> int:
+        return -1
+
+
+class RateLimiter:
+    """Token-bucket rate limits and per-user in-flight caps, checked before any upstream call.
+
+    Backend failures are logged and the request is let through: the limiter
+    protects the upstreams but must not become an outage of its own.
+    """
+
+    def __init__(self, backend=None, max_in_flight: int = RATE_LIMIT_MAX_IN_FLIGHT):
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def check(self, policy: str, key: str):
+        """Spend one token from the policy's bucket for key, or raise RateLimited"""
+        if not self.enabled:
+            return
+        rate, burst = POLICIES[policy]
+        try:
+            wait = await self.backend.take(f"{policy}:{key}", rate, burst)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limiter backend error: %s", e)
+            return
+        if wait > 0:
+            RATE_LIMITED.inc(policy, "rate")
+            raise RateLimited(wait, "rate")
+
+    async def acquire_slot(self, user_id: str) -> Optional["InFlightSlot"]:
+        """Take one of the user's concurrent-request slots, or raise RateLimited.
+
+        Returns None when concurrency is not being tracked (disabled or the
+        backend is failing); otherwise the caller must release the slot.
+        """
+        if not self.enabled or self.max_in_flight <= 0:
+            return None
+        key = f"user:{user_id}"
+        try:
+            acquired = await self.backend.acquire(key, self.max_in_flight)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limiter backend error: %s", e)
+            return None
+        if not acquired:
+            RATE_LIMITED.inc("user", "concurrency")
+            raise RateLimited(1, "concurrency")
+        return InFlightSlot(self, key)
+
+
+class InFlightSlot:
+    """A held concurrent-request slot. release() is idempotent; a streamed
+    response keeps the slot until its body has been sent or abandoned."""
+
+    def __init__(self, limiter: RateLimiter, key: str):
+        self.limiter = limiter
+        self.key = key
+        self.released = False
+
+    async def release(self):
+        if self.released:
+            return
+        try:
+            await self.limiter.backend.release(self.key)
+        except Exception as e:
+            self.limiter.errors += 1
+            logger.warning("Rate limiter backend error: %s", e)
+        # Only set once done: a release cancelled along with the body is retried by the background task
+        self.released = True
+
+    def release_after(self, response: Response) -> Response:
+        """Release once the response has been sent, rather than when its headers arrive"""
+        if isinstance(response, StreamingResponse):
+            response.body_iterator = self._release_when_done(response.body_iterator)
+        # Also covers a body that never started or whose stream was cancelled
+        add_background(response, self.release)
+        return response
+
+    async def _release_when_done(self, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await self.release()
+
+
+def _parse_networks(value: str) -> list:
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+
+_TRUSTED_NETWORKS = _parse_networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _TRUSTED_NETWORKS)
+
+
+def client_ip(request: Request) -> str:
+    """Client address, honouring X-Forwarded-For / X-Real-IP only when sent by a trusted proxy"""
+    peer = request.client.host if request.client else "unknown"
+    if not _is_trusted(peer):
+        return peer
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        # Rightmost address not added by one of our own proxies
+        for address in reversed([item.strip() for item in forwarded.split(",") if item.strip()]):
+            if not _is_trusted(address):
+                return address
+    return request.headers.get("x-real-ip", peer)
+
+
+def create_backend(kind: str = RATE_LIMIT_BACKEND):
+    if not RATE_LIMIT_ENABLED:
+        return None
+    if kind == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+rate_limiter = RateLimiter(create_backend())
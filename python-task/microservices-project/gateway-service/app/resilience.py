@@ -0,0 +1,153 @@
+import os
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker settings
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+# Seconds an open circuit fails fast before letting a probe through
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "10"))
+
+# Retry settings (idempotent requests without a body only)
+RETRY_MAX_RETRIES = int(os.getenv("RETRY_MAX_RETRIES", "2"))
+RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "0.05"))
+RETRY_BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "1.0"))
+# Retries may add at most this fraction of recent requests, plus a small floor
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "5"))
+RETRY_BUDGET_WINDOW = int(os.getenv("RETRY_BUDGET_WINDOW", "10"))
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Responses that signal an overloaded or unreachable upstream rather than a bad request
+FAILURE_STATUSES = frozenset({502, 503, 504})
+
+
+def is_load_shed(status_code: int, headers) -> bool:
+    """Deliberate backpressure from a healthy upstream: 429, or 503 with Retry-After.
+
+    These are relayed to the client as-is; they neither count against the
+    circuit breaker nor get retried, which would only add to the load.
+    """
+    return status_code == 429 or (status_code == 503 and "retry-after" in headers)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with time-slotted half-open probing.
+
+    Closed: all calls pass; BREAKER_FAILURE_THRESHOLD consecutive failures open it.
+    Open: calls fail fast until reset_timeout has passed.
+    Half-open: one probe per reset_timeout passes; its success closes the circuit,
+    its failure reopens it. Probes are slotted by time rather than counted, so a
+    probe that never reports back cannot wedge the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._next_probe_at = 0.0
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._next_probe_at = now
+            logger.info("Circuit for %s half-open, probing", self.name)
+        if now >= self._next_probe_at:
+            self._next_probe_at = now + self.reset_timeout
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            logger.info("Circuit for %s closed", self.name)
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning("Circuit for %s opened after %s consecutive failures", self.name, self.failures)
+
+    def retry_after(self) -> float:
+        """Seconds until the next call may be let through"""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            return max(self.opened_at + self.reset_timeout - now, 0.0)
+        if self.state == self.HALF_OPEN:
+            return max(self._next_probe_at - now, 0.0)
+        return 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_after": round(self.retry_after(), 3),
+        }
+
+
+class RetryBudget:
+    """Caps retries at ratio x requests over a sliding window of one-second buckets, plus a floor.
+
+    Bounds the extra load retries can add when an upstream is struggling,
+    instead of multiplying it by the per-request retry count.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND, window: int = RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self._requests = [0] * window
+        self._retries = [0] * window
+        self._second = int(time.monotonic())
+
+    def _advance(self):
+        now = int(time.monotonic())
+        elapsed = now - self._second
+        if elapsed <= 0:
+            return
+        for offset in range(1, min(elapsed, self.window) + 1):
+            slot = (self._second + offset) % self.window
+            self._requests[slot] = 0
+            self._retries[slot] = 0
+        self._second = now
+
+    def record_request(self):
+        self._advance()
+        self._requests[self._second % self.window] += 1
+
+    def try_acquire(self) -> bool:
+        """Spend one retry if the budget allows it"""
+        self._advance()
+        allowed = self.ratio * sum(self._requests) + self.min_per_second * self.window
+        if sum(self._retries) >= allowed:
+            return False
+        self._retries[self._second % self.window] += 1
+        return True
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number attempt (0-based)"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt)))
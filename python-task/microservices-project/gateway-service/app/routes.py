@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+from .clients import USER_SERVICE, TASK_SERVICE
+
+
+@dataclass(frozen=True)
+class Route:
+    """A path prefix served by one upstream, with its auth and header policy"""
+    prefix: str
+    upstream: str
+    # Require a valid bearer token before forwarding
+    auth: bool = True
+    # Forward the token's user_id to the upstream as X-User-Id
+    inject_user_id: bool = False
+    # Match only the prefix itself, not paths below it
+    exact: bool = False
+    # Allowed HTTP methods; None allows any
+    methods: Optional[FrozenSet[str]] = None
+    # Upstream deadline in seconds, retries included; None uses the upstream's timeout
+    timeout: Optional[float] = None
+    # Rate limit policy: "user" (by verified user_id), "ip" (by client address) or None
+    rate_limit: Optional[str] = "user"
+    # Share one upstream call among identical concurrent authenticated GETs
+    coalesce: bool = False
+
+
+# Gateway route table. New upstream endpoints under an existing prefix need no changes here.
+ROUTE_TABLE: List[Route] = [
+    Route("/register", USER_SERVICE, auth=False, exact=True, methods=frozenset({"POST"}), rate_limit="ip"),
+    Route("/login", USER_SERVICE, auth=False, exact=True, methods=frozenset({"POST"}), rate_limit="ip"),
+    Route("/users/me", USER_SERVICE, exact=True, methods=frozenset({"GET"}), timeout=5.0),
+    # Streamed end to end; never buffered for coalescing
+    Route("/tasks/export", TASK_SERVICE, inject_user_id=True, exact=True, methods=frozenset({"GET"})),
+    # Request body streamed upstream; long-running, and resumable by import_id if cut off
+    Route("/tasks/import", TASK_SERVICE, inject_user_id=True, exact=True, methods=frozenset({"POST"}), timeout=600.0),
+    Route("/tasks", TASK_SERVICE, inject_user_id=True, coalesce=True),
+]
+
+
+class _Node:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.route: Optional[Route] = None
+
+
+class RouteMatcher:
+    """Segment trie over route prefixes; a lookup walks at most one node per path segment"""
+
+    def __init__(self, routes: List[Route]):
+        self._root = _Node()
+        for route in routes:
+            node = self._root
+            for segment in _segments(route.prefix):
+                node = node.children.setdefault(segment, _Node())
+            if node.route is not None:
+                raise ValueError(f"Duplicate gateway route prefix: {route.prefix}")
+            node.route = route
+
+    def match(self, path: str) -> Optional[Route]:
+        """Return the longest-prefix route for a request path"""
+        segments = _segments(path)
+        node = self._root
+        best = None
+        for depth in range(len(segments) + 1):
+            if depth:
+                node = node.children.get(segments[depth - 1])
+                if node is None:
+                    break
+            if node.route is not None and (not node.route.exact or depth == len(segments)):
+                best = node.route
+        return best
+
+
+def _segments(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+router = RouteMatcher(ROUTE_TABLE)
@@ -0,0 +1,106 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from .metrics import registry
+
+# Verified-token cache settings
+JWT_CACHE_ENABLED = os.getenv("JWT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+# Upper bound on how long claims are trusted without re-verifying, even if exp is later
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "1800"))
+
+RevocationHook = Callable[[dict], bool]
+
+
+class TokenCache:
+    """Bounded LRU of verified JWT claims, keyed by token hash and expiring at the token's exp.
+
+    Every method runs to completion without awaiting, so concurrent asyncio
+    tasks on the event loop can never observe a partially updated cache.
+    """
+
+    def __init__(self, max_size: int = JWT_CACHE_SIZE, max_ttl: float = JWT_CACHE_TTL):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+        self._revocation_hooks: List[RevocationHook] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        # Store a digest rather than the bearer token itself
+        return hashlib.sha256(token.encode()).digest()
+
+    def add_revocation_hook(self, hook: RevocationHook):
+        """Register a callable that returns True for claims that must no longer be accepted"""
+        self._revocation_hooks.append(hook)
+
+    def is_revoked(self, claims: dict) -> bool:
+        return any(hook(claims) for hook in self._revocation_hooks)
+
+    def get(self, token: str) -> Optional[dict]:
+        """Return cached claims for a token, or None if absent, expired or revoked"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        claims, expires_at = entry
+        if expires_at <= time.time() or self.is_revoked(claims):
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        """Cache verified claims until the token's exp (capped by max_ttl)"""
+        expires_at = time.time() + self.max_ttl
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+
+        key = self._key(token)
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, token: str):
+        """Drop a single token, e.g. on logout"""
+        self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+token_cache = TokenCache()
+
+registry.callback(
+    "gateway_jwt_cache_lookups_total",
+    "Verified-token cache lookups",
+    ("result",),
+    lambda: {("hit",): token_cache.hits, ("miss",): token_cache.misses},
+    type="counter",
+)
+registry.callback("gateway_jwt_cache_entries", "Verified-token cache size", (), lambda: {(): len(token_cache._entries)})
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Response cache settings
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()  # memory | redis | none
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "task-service")
+# task-service processes sharing one database (replicas x uvicorn workers). The memory
+# backend keeps owner versions per process, so with more than one a write on one
+# process leaves the others serving stale lists and ETags; it is refused then.
+SERVICE_REPLICAS = int(os.getenv("SERVICE_REPLICAS", "1"))
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: bytes, ttl: int):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self._store(key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: int) -> bool:
+        """Set only if absent; returns whether the value was stored"""
+        if self._live(key) is not None:
+            return False
+        self._store(key, value, ttl)
+        return True
+
+    async def incr(self, key: str, ttl: int) -> int:
+        value = int(self._live(key) or 0) + 1
+        self._store(key, str(value).encode(), ttl)
+        return value
+
+
+class RedisBackend:
+    """Redis-protocol backend; pass any client exposing get/set/incr/expire (e.g. a local stand-in in tests)"""
+
+    def __init__(self, client=None, url: str = REDIS_URL):
+        if client is None:
+            # Optional dependency, only needed when CACHE_BACKEND=redis
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(url)
+        self._client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self._client.set(key, value, ex=ttl)
+
+    async def add(self, key: str, value: bytes, ttl: int) -> bool:
+        return bool(await self._client.set(key, value, ex=ttl, nx=True))
+
+    async def incr(self, key: str, ttl: int) -> int:
+        value = await self._client.incr(key)
+        await self._client.expire(key, ttl)
+        return int(value)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: Dict[str, str]
+
+
+class TaskCache:
+    """Read-through cache of serialized task responses, versioned per owner.
+
+    Every key embeds the owner's current version, so bumping the version on a
+    write orphans exactly that owner's entries; they age out via TTL/LRU.
+    Backend failures are logged and treated as misses.
+    """
+
+    def __init__(self, backend=None, ttl: int = CACHE_TTL, prefix: str = CACHE_KEY_PREFIX):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _version_key(self, owner_id: int) -> str:
+        return f"{self.prefix}:tasks:{owner_id}:version"
+
+    async def version(self, owner_id: int) -> int:
+        """Current version of an owner's task data"""
+        key = self._version_key(owner_id)
+        value = await self.backend.get(key)
+        if value is None:
+            # Seed from the clock so a lost or evicted version never reuses an old number
+            seed = time.time_ns()
+            if await self.backend.add(key, str(seed).encode(), self.ttl * 2):
+                return seed
+            value = await self.backend.get(key)
+        return int(value)
+
+    def _entry_key(self, owner_id: int, version: int, name: str) -> str:
+        return f"{self.prefix}:tasks:{owner_id}:{version}:{name}"
+
+    async def get(self, owner_id: int, name: str) -> Tuple[Optional[int], Optional[CachedResponse]]:
+        """Return (owner version, cached response); the version is None when the cache is unusable"""
+        if not self.enabled:
+            return None, None
+        try:
+            version = await self.version(owner_id)
+            raw = await self.backend.get(self._entry_key(owner_id, version, name))
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Task cache read failed: %s", e)
+            return None, None
+
+        if raw is None:
+            self.misses += 1
+            return version, None
+        self.hits += 1
+        header_line, body = raw.split(b"\n", 1)
+        return version, CachedResponse(body, json.loads(header_line))
+
+    async def set(self, owner_id: int, version: Optional[int], name: str, body: bytes, headers: Optional[Dict[str, str]] = None):
+        """Store a response under the version that was current before it was read from the DB"""
+        if not self.enabled or version is None:
+            return
+        raw = json.dumps(headers or {}).encode() + b"\n" + body
+        try:
+            await self.backend.set(self._entry_key(owner_id, version, name), raw, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Task cache write failed: %s", e)
+
+    async def invalidate(self, owner_id: int):
+        """Bump an owner's version after any write to their tasks"""
+        if not self.enabled:
+            return
+        try:
+            await self.version(owner_id)
+            await self.backend.incr(self._version_key(owner_id), self.ttl * 2)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Task cache invalidation failed: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_backend(kind: str = CACHE_BACKEND, replicas: int = SERVICE_REPLICAS):
+    if kind == "none":
+        return None
+    if kind == "redis":
+        return RedisBackend()
+    if replicas > 1:
+        raise ValueError(
+            f"CACHE_BACKEND=memory cannot be shared by {replicas} task-service processes; "
+            "set CACHE_BACKEND=redis (or none)"
+        )
+    return MemoryBackend()
+
+
+def warn_if_process_local():
+    """Log at startup when invalidations only reach this process"""
+    if isinstance(task_cache.backend, MemoryBackend):
+        logger.warning(
+            "Task cache uses the in-process memory backend; writes on other task-service "
+            "replicas will not invalidate it. Use CACHE_BACKEND=redis when scaling out."
+        )
+
+
+task_cache = TaskCache(create_backend())
+
+registry.callback(
+    "task_cache_lookups_total",
+    "Task response cache lookups",
+    ("result",),
+    lambda: {("hit",): task_cache.hits, ("miss",): task_cache.misses, ("error",): task_cache.errors},
+    type="counter",
+)
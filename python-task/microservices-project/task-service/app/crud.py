@@ -1,8 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
-from typing import List, Optional
+from sqlalchemy import select, insert, update, delete, tuple_, literal, and_, or_, func, text, cast, Date
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 from . import models, schemas
+from .pagination import Cursor
+from .tracing import traced
 
+@traced
 async def create_task(db: AsyncSession, task: schemas.TaskCreate, owner_id: int) -> models.Task:
     """Create a new task"""
     db_task = models.Task(
@@ -11,48 +17,462 @@ async def create_task(db: AsyncSession, task: schemas.TaskCreate, owner_id: int)
         owner_id=owner_id
     )
     db.add(db_task)
+    await db.flush()
+    await record_task_stats(db, owner_id, [(db_task.completed, db_task.created_at)], 1)
     await db.commit()
     await db.refresh(db_task)
     return db_task
 
+@traced
 async def get_task(db: AsyncSession, task_id: int) -> Optional[models.Task]:
     """Get a task by ID"""
     result = await db.execute(select(models.Task).where(models.Task.id == task_id))
     return result.scalar_one_or_none()
 
-async def get_user_tasks(db: AsyncSession, owner_id: int, skip: int = 0, limit: int = 100) -> List[models.Task]:
-    """Get all tasks for a specific user"""
-    result = await db.execute(
+def after_cursor(query, cursor: Cursor):
+    """Restrict a newest-first task query to rows after a keyset cursor"""
+    created_at, task_id = cursor
+    # Row-value comparison lets the planner seek the composite index directly
+    return query.where(
+        tuple_(models.Task.created_at, models.Task.id)
+        < tuple_(literal(created_at, models.Task.created_at.type), literal(task_id, models.Task.id.type))
+    )
+
+@traced
+async def get_user_tasks(
+    db: AsyncSession,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[Cursor] = None
+) -> List[models.Task]:
+    """Get tasks for a specific user, newest first.
+
+    With a cursor the page is located by an index seek on
+    (owner_id, created_at, id), so cost does not grow with depth; skip is the
+    legacy OFFSET path.
+    """
+    query = (
         select(models.Task)
         .where(models.Task.owner_id == owner_id)
-        .offset(skip)
-        .limit(limit)
-        .order_by(models.Task.created_at.desc())
+        .order_by(models.Task.created_at.desc(), models.Task.id.desc())
     )
+    if cursor is not None:
+        query = after_cursor(query, cursor)
+    elif skip:
+        query = query.offset(skip)
+    result = await db.execute(query.limit(limit))
     return result.scalars().all()
 
-async def update_task(db: AsyncSession, task_id: int, task_update: schemas.TaskUpdate) -> models.Task:
-    """Update a task"""
-    # Get the current task
-    task = await get_task(db, task_id)
-    if not task:
-        return None
-    
-    # Update fields that are provided
+def text_match(q: str, dialect: str):
+    """Full-text condition for q: the GIN-indexed tsvector on Postgres, LIKE on every term elsewhere"""
+    if dialect == "postgresql":
+        return models.search_document.op("@@")(func.websearch_to_tsquery(models.SEARCH_CONFIG, q))
+    # SQLite (tests): every whitespace-separated term must occur in title or description
+    return and_(*(
+        or_(
+            func.lower(models.Task.title).contains(term, autoescape=True),
+            func.lower(func.coalesce(models.Task.description, "")).contains(term, autoescape=True),
+        )
+        for term in q.lower().split()
+    ))
+
+@traced
+async def search_tasks(
+    db: AsyncSession,
+    owner_id: int,
+    q: Optional[str] = None,
+    completed: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    limit: int = 50,
+    cursor: Optional[Cursor] = None
+) -> List[models.Task]:
+    """Search a user's tasks by text and filters, newest first with keyset pagination.
+
+    Ordering matches get_user_tasks (not relevance), so the same cursors work
+    and filters on completed/created_at stay on the owner's composite indexes.
+    """
+    query = (
+        select(models.Task)
+        .where(models.Task.owner_id == owner_id)
+        .order_by(models.Task.created_at.desc(), models.Task.id.desc())
+    )
+    if q and q.strip():
+        query = query.where(text_match(q, db.bind.dialect.name))
+    if completed is not None:
+        query = query.where(models.Task.completed == completed)
+    if created_after is not None:
+        query = query.where(models.Task.created_at >= created_after)
+    if created_before is not None:
+        query = query.where(models.Task.created_at < created_before)
+    if updated_after is not None:
+        query = query.where(models.Task.updated_at >= updated_after)
+    if updated_before is not None:
+        query = query.where(models.Task.updated_at < updated_before)
+    if cursor is not None:
+        query = after_cursor(query, cursor)
+    result = await db.execute(query.limit(limit))
+    return result.scalars().all()
+
+# Columns written by exports, in output order
+EXPORT_COLUMNS = (
+    models.Task.id,
+    models.Task.title,
+    models.Task.description,
+    models.Task.completed,
+    models.Task.created_at,
+    models.Task.updated_at,
+)
+
+async def stream_user_tasks(db: AsyncSession, owner_id: int, batch_size: int = 1000) -> AsyncIterator[Sequence]:
+    """Yield all of a user's tasks, oldest first, in batches of rows from a server-side cursor.
+
+    Selects plain columns rather than ORM objects, so nothing accumulates in
+    the session and at most one batch is held in memory.
+    """
+    result = await db.stream(
+        select(*EXPORT_COLUMNS)
+        .where(models.Task.owner_id == owner_id)
+        .order_by(models.Task.created_at, models.Task.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for partition in result.partitions():
+        yield partition
+
+@traced
+async def start_import(db: AsyncSession, owner_id: int, import_id: str) -> int:
+    """Register a bulk import if it is new; returns how many of its input rows are already loaded"""
+    insert_ = _upsert(db.bind.dialect.name)
+    await db.execute(
+        insert_(models.ImportCheckpoint)
+        .values(owner_id=owner_id, import_id=import_id, rows=0)
+        .on_conflict_do_nothing()
+    )
+    result = await db.execute(
+        select(models.ImportCheckpoint.rows)
+        .where(models.ImportCheckpoint.owner_id == owner_id, models.ImportCheckpoint.import_id == import_id)
+    )
+    rows = result.scalar_one()
+    await db.commit()
+    return rows
+
+# Task columns written by bulk imports, in COPY order
+IMPORT_COLUMNS = ("title", "description", "completed", "owner_id", "created_at", "updated_at")
+
+async def _copy_tasks(db: AsyncSession, rows: List[dict]):
+    """COPY rows into tasks over the session's asyncpg connection"""
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        models.Task.__tablename__,
+        columns=IMPORT_COLUMNS,
+        records=[tuple(row[name] for name in IMPORT_COLUMNS) for row in rows],
+    )
+
+@traced
+async def import_tasks(
+    db: AsyncSession,
+    owner_id: int,
+    import_id: str,
+    rows: List[dict],
+    checkpoint: int,
+    next_checkpoint: int
+) -> bool:
+    """Load a batch of task rows and move the import's checkpoint on, in one transaction.
+
+    Rows go through COPY on asyncpg and an executemany INSERT elsewhere. Returns
+    False, loading nothing, when the checkpoint is no longer at `checkpoint`
+    because another run of the same import got there first.
+    """
+    # Moving the checkpoint first locks it, so runs of one import cannot
+    # interleave; it also opens the transaction the COPY below runs in
+    advanced = await db.execute(
+        update(models.ImportCheckpoint)
+        .where(
+            models.ImportCheckpoint.owner_id == owner_id,
+            models.ImportCheckpoint.import_id == import_id,
+            models.ImportCheckpoint.rows == checkpoint,
+        )
+        .values(rows=next_checkpoint)
+        .execution_options(synchronize_session=False)
+    )
+    if advanced.rowcount != 1:
+        await db.rollback()
+        return False
+    if rows:
+        if db.bind.dialect.driver == "asyncpg":
+            await _copy_tasks(db, rows)
+        else:
+            await db.execute(insert(models.Task), rows)
+        await record_task_stats(db, owner_id, [(row["completed"], row["created_at"]) for row in rows], 1)
+    await db.commit()
+    return True
+
+@traced
+async def get_task_owner(db: AsyncSession, task_id: int) -> Optional[int]:
+    """Get the owner of a task, or None if it does not exist"""
+    result = await db.execute(select(models.Task.owner_id).where(models.Task.id == task_id))
+    return result.scalar_one_or_none()
+
+@traced
+async def update_task(
+    db: AsyncSession,
+    task_id: int,
+    owner_id: int,
+    task_update: schemas.TaskUpdate
+) -> Optional[models.Task]:
+    """Update a task owned by owner_id in a single UPDATE ... RETURNING.
+
+    Returns None when no task with that id belongs to the owner.
+    """
     update_data = task_update.dict(exclude_unset=True)
-    if update_data:
-        await db.execute(
-            update(models.Task)
-            .where(models.Task.id == task_id)
-            .values(**update_data)
+    if not update_data:
+        result = await db.execute(
+            select(models.Task)
+            .where(models.Task.id == task_id, models.Task.owner_id == owner_id)
         )
+        return result.scalar_one_or_none()
+    
+    query = (
+        update(models.Task)
+        .values(**update_data)
+        .execution_options(synchronize_session=False)
+    )
+    owned = (models.Task.id == task_id, models.Task.owner_id == owner_id)
+    if "completed" not in update_data:
+        result = await db.execute(query.where(*owned).returning(models.Task))
+        task = result.scalar_one_or_none()
         await db.commit()
-        await db.refresh(task)
+        return task
     
+    if db.bind.dialect.name == "postgresql":
+        # The CTE locks the row and reads its previous completed flag, so the
+        # stats delta comes from the same statement as the update
+        previous = select(models.Task.id, models.Task.completed).where(*owned).with_for_update().cte("previous")
+        result = await db.execute(
+            query.where(models.Task.id == previous.c.id).returning(models.Task, previous.c.completed)
+        )
+        row = result.one_or_none()
+    else:
+        # SQLite's RETURNING only sees the new row; its single writer makes a
+        # local read in the same transaction equivalent
+        was_completed = (await db.execute(select(models.Task.completed).where(*owned))).scalar_one_or_none()
+        result = await db.execute(query.where(*owned).returning(models.Task))
+        task = result.scalar_one_or_none()
+        row = (task, was_completed) if task is not None else None
+    if row is None:
+        await db.commit()
+        return None
+    task, was_completed = row
+    if bool(task.completed) != bool(was_completed):
+        await apply_stats_delta(db, owner_id, completed=1 if task.completed else -1)
+    await db.commit()
     return task
 
-async def delete_task(db: AsyncSession, task_id: int) -> bool:
-    """Delete a task"""
-    result = await db.execute(delete(models.Task).where(models.Task.id == task_id))
+@traced
+async def delete_task(db: AsyncSession, task_id: int, owner_id: int) -> bool:
+    """Delete a task owned by owner_id in a single DELETE ... RETURNING"""
+    result = await db.execute(
+        delete(models.Task)
+        .where(models.Task.id == task_id, models.Task.owner_id == owner_id)
+        .returning(models.Task.completed, models.Task.created_at)
+    )
+    row = result.one_or_none()
+    if row is not None:
+        await record_task_stats(db, owner_id, [tuple(row)], -1)
+    await db.commit()
+    return row is not None
+
+@traced
+async def create_tasks(db: AsyncSession, tasks: List[schemas.TaskCreate], owner_id: int) -> List[models.Task]:
+    """Create many tasks with one multi-row INSERT ... RETURNING in one transaction"""
+    if not tasks:
+        return []
+    result = await db.execute(
+        insert(models.Task).returning(models.Task, sort_by_parameter_order=True),
+        [
+            {"title": task.title, "description": task.description, "owner_id": owner_id}
+            for task in tasks
+        ]
+    )
+    created = result.scalars().all()
+    await record_task_stats(db, owner_id, [(task.completed, task.created_at) for task in created], 1)
+    await db.commit()
+    return created
+
+@traced
+async def get_task_owners(db: AsyncSession, task_ids: List[int], lock: bool = False) -> Dict[int, int]:
+    """Map each existing task id in task_ids to its owner"""
+    query = select(models.Task.id, models.Task.owner_id).where(models.Task.id.in_(task_ids))
+    if lock:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    return dict(result.all())
+
+@traced
+async def update_tasks(
+    db: AsyncSession,
+    items: List[schemas.TaskBatchUpdateItem],
+    owner_id: int
+) -> Tuple[Dict[int, int], Dict[int, models.Task]]:
+    """Update many owned tasks with one executemany UPDATE in one transaction.
+
+    Returns the owner of every requested id that exists (for 403/404
+    reporting) and the caller's updated rows, both keyed by task id.
+    """
+    owners = await get_task_owners(db, [item.id for item in items], lock=True)
+    rows = []
+    for item in items:
+        values = item.dict(exclude_unset=True, exclude={"id"})
+        if owners.get(item.id) == owner_id and values:
+            rows.append({"id": item.id, **values})
+    if rows:
+        # Rows are locked above, so the completed flags read here stay current
+        flips = {row["id"]: bool(row["completed"]) for row in rows if "completed" in row}
+        if flips:
+            result = await db.execute(
+                select(models.Task.id, models.Task.completed).where(models.Task.id.in_(flips))
+            )
+            delta = sum(
+                (1 if flips[task_id] else -1)
+                for task_id, completed in result.all()
+                if bool(completed) != flips[task_id]
+            )
+            if delta:
+                await apply_stats_delta(db, owner_id, completed=delta)
+        # ORM bulk UPDATE by primary key: executemany, grouped by updated columns
+        await db.execute(update(models.Task), rows)
+    
+    owned_ids = [task_id for task_id, owner in owners.items() if owner == owner_id]
+    updated = {}
+    if owned_ids:
+        result = await db.execute(
+            select(models.Task)
+            .where(models.Task.id.in_(owned_ids))
+            .execution_options(populate_existing=True)
+        )
+        updated = {task.id: task for task in result.scalars()}
+    await db.commit()
+    return owners, updated
+
+@traced
+async def delete_tasks(db: AsyncSession, task_ids: List[int], owner_id: int) -> Set[int]:
+    """Delete many owned tasks with one DELETE ... RETURNING; returns the deleted ids"""
+    if not task_ids:
+        return set()
+    result = await db.execute(
+        delete(models.Task)
+        .where(models.Task.id.in_(task_ids), models.Task.owner_id == owner_id)
+        .returning(models.Task.id, models.Task.completed, models.Task.created_at)
+    )
+    rows = result.all()
+    await record_task_stats(db, owner_id, [(completed, created_at) for _, completed, created_at in rows], -1)
+    await db.commit()
+    return {task_id for task_id, _, _ in rows}
+
+def _upsert(dialect: str):
+    """Dialect insert construct supporting ON CONFLICT DO UPDATE"""
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+def _utc_day(created_at: datetime) -> date:
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+async def apply_stats_delta(
+    db: AsyncSession,
+    owner_id: int,
+    total: int = 0,
+    completed: int = 0,
+    created: Optional[Dict[date, int]] = None
+):
+    """Add to a user's task counters with atomic upserts, in the caller's transaction"""
+    insert_ = _upsert(db.bind.dialect.name)
+    if total or completed:
+        stmt = insert_(models.TaskStats).values(owner_id=owner_id, total=total, completed=completed)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.TaskStats.owner_id],
+            set_={
+                "total": models.TaskStats.total + stmt.excluded.total,
+                "completed": models.TaskStats.completed + stmt.excluded.completed,
+            },
+        ))
+    days = [{"owner_id": owner_id, "day": day, "created": count} for day, count in (created or {}).items() if count]
+    if days:
+        stmt = insert_(models.TaskDailyStats).values(days)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.TaskDailyStats.owner_id, models.TaskDailyStats.day],
+            set_={"created": models.TaskDailyStats.created + stmt.excluded.created},
+        ))
+
+async def record_task_stats(db: AsyncSession, owner_id: int, tasks: Iterable[Tuple[Optional[bool], datetime]], sign: int):
+    """Count tasks as created (sign=1) or deleted (sign=-1), given their (completed, created_at)"""
+    tasks = list(tasks)
+    if not tasks:
+        return
+    days = Counter(_utc_day(created_at) for _, created_at in tasks if created_at is not None)
+    await apply_stats_delta(
+        db,
+        owner_id,
+        total=sign * len(tasks),
+        completed=sign * sum(1 for completed, _ in tasks if completed),
+        created={day: sign * count for day, count in days.items()},
+    )
+
+@traced
+async def get_task_stats(db: AsyncSession, owner_id: int, since: date) -> Tuple[Optional[models.TaskStats], List[models.TaskDailyStats]]:
+    """A user's counters and per-day creation counts from since on: two primary key lookups"""
+    stats = await db.get(models.TaskStats, owner_id)
+    result = await db.execute(
+        select(models.TaskDailyStats)
+        .where(models.TaskDailyStats.owner_id == owner_id, models.TaskDailyStats.day >= since)
+        .order_by(models.TaskDailyStats.day)
+    )
+    return stats, result.scalars().all()
+
+async def rebuild_task_stats(db: AsyncSession, owner_id: Optional[int] = None) -> int:
+    """Recompute stats from the tasks table for one user or everyone; returns users rebuilt.
+
+    On Postgres the tasks table is locked against writes for the duration, so
+    no concurrent write's delta can be lost between the delete and the recount.
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        await db.execute(text("LOCK TABLE tasks IN SHARE MODE"))
+        day = cast(func.timezone("UTC", models.Task.created_at), Date)
+    else:
+        day = func.date(models.Task.created_at)
+    
+    scope = [] if owner_id is None else [models.Task.owner_id == owner_id]
+    for table in (models.TaskStats, models.TaskDailyStats):
+        query = delete(table)
+        if owner_id is not None:
+            query = query.where(table.owner_id == owner_id)
+        await db.execute(query)
+    
+    result = await db.execute(
+        insert(models.TaskStats).from_select(
+            ["owner_id", "total", "completed"],
+            select(
+                models.Task.owner_id,
+                func.count(),
+                func.count().filter(models.Task.completed.is_(True)),
+            )
+            .where(*scope)
+            .group_by(models.Task.owner_id)
+        ).returning(models.TaskStats.owner_id)
+    )
+    rebuilt = len(result.all())
+    await db.execute(
+        insert(models.TaskDailyStats).from_select(
+            ["owner_id", "day", "created"],
+            select(models.Task.owner_id, day, func.count())
+            .where(*scope)
+            .group_by(models.Task.owner_id, day)
+        )
+    )
     await db.commit()
-    return result.rowcount > 0
\ No newline at end of file
+    return rebuilt
@@ -0,0 +1,80 @@
+"""Request deadlines propagated by the gateway.
+
+Each service is built from its own Docker context, so user-service and
+task-service carry identical copies of this module; change them together.
+
+The gateway sends the time it has left for an upstream call in
+X-Request-Timeout (milliseconds). Handling stops when that runs out: the
+request is cancelled, which also cancels a running asyncpg statement, and
+answered with 504 if nothing has been sent yet, since the gateway is no longer
+waiting for the result.
+"""
+import json
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import FastAPI
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+DEADLINE_EXCEEDED = registry.counter(
+    "http_deadline_exceeded_total", "Requests cancelled because the caller's X-Request-Timeout ran out"
+)
+
+
+def _budget(scope) -> Optional[float]:
+    """Seconds allowed by the request's X-Request-Timeout, or None without a valid one"""
+    for name, value in scope["headers"]:
+        if name == DEADLINE_HEADER:
+            try:
+                return max(int(value), 0) / 1000
+            except ValueError:
+                return None
+    return None
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware bounding a request, response body included, by its X-Request-Timeout"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        budget = _budget(scope) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_with_state(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            async with asyncio.timeout(budget):
+                await self.app(scope, receive, send_with_state)
+        except TimeoutError:
+            DEADLINE_EXCEEDED.inc()
+            logger.warning("Deadline of %.0fms exceeded: %s %s", budget * 1000, scope["method"], scope["path"])
+            if started:
+                return
+            body = json.dumps({"detail": "Request deadline exceeded"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+
+
+def install(app: FastAPI):
+    """Add the deadline middleware; call before the metrics and logging middleware so they see its 504s"""
+    app.add_middleware(DeadlineMiddleware)
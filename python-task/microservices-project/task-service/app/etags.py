@@ -0,0 +1,43 @@
+import json
+import hashlib
+from typing import Optional
+from . import models
+
+# Clients must revalidate, but may reuse their copy after a 304
+CACHE_CONTROL = "private, no-cache"
+
+
+def list_etag(owner_id: int, version: int, query: str) -> str:
+    """Strong ETag for a task list page, derived from the owner's data version"""
+    digest = hashlib.blake2b(f"{owner_id}:{query}".encode(), digest_size=8).hexdigest()
+    return f'"l{version:x}-{digest}"'
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag from the response bytes, for when no owner version is available"""
+    return f'"c{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def task_etag(task: models.Task) -> str:
+    """Strong ETag for a single task, hashed from every field of its response.
+
+    updated_at alone is not enough: SQLite stores it with second resolution,
+    so two writes within one second would share a tag.
+    """
+    content = json.dumps(
+        [task.title, task.description, task.completed, task.owner_id,
+         task.created_at.isoformat() if task.created_at else None,
+         task.updated_at.isoformat() if task.updated_at else None],
+        separators=(",", ":"),
+    )
+    return f'"t{task.id}-{hashlib.blake2b(content.encode(), digest_size=8).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """If-None-Match evaluation (RFC 9110 13.1.2): weak comparison against a list or '*'"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
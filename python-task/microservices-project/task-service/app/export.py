@@ -0,0 +1,66 @@
+import os
+import io
+import csv
+import json
+import logging
+from typing import AsyncIterator, Sequence
+
+from . import crud
+from .database import async_session
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per server-side cursor round trip, and written per response chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_FIELDS = [column.key for column in crud.EXPORT_COLUMNS]
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def _ndjson(rows: Sequence) -> bytes:
+    lines = []
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record["created_at"] = record["created_at"].isoformat() if record["created_at"] else None
+        record["updated_at"] = record["updated_at"].isoformat() if record["updated_at"] else None
+        lines.append(json.dumps(record, separators=(",", ":")))
+    lines.append("")
+    return "\n".join(lines).encode()
+
+
+def _csv(rows: Sequence, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(
+        (task_id, title, description, "true" if completed else "false",
+         created_at.isoformat() if created_at else "", updated_at.isoformat() if updated_at else "")
+        for task_id, title, description, completed, created_at, updated_at in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def export_tasks(owner_id: int, fmt: str) -> AsyncIterator[bytes]:
+    """Yield a user's tasks as NDJSON or CSV chunks, one chunk per cursor batch.
+
+    Opens its own session: a request-scoped one is closed before a streaming
+    body is sent. If the export fails midway the error is logged and the
+    stream is cut short, since the status line has already gone out.
+    """
+    if fmt == "csv":
+        yield _csv([], header=True)
+    exported = 0
+    try:
+        async with async_session() as db:
+            async for rows in crud.stream_user_tasks(db, owner_id, EXPORT_BATCH_SIZE):
+                yield _csv(rows) if fmt == "csv" else _ndjson(rows)
+                exported += len(rows)
+    except Exception as e:
+        logger.error("Task export failed for user %s after %s rows: %s", owner_id, exported, e)
+        raise
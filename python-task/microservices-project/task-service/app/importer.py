@@ -0,0 +1,278 @@
+"""Bulk task import from NDJSON or CSV, shared by POST /tasks/import and the CLI.
+
+    python -m app.importer --owner-id 42 tasks.ndjson
+    python -m app.importer --owner-id 42 --import-id acme-2024 tasks.csv   # rerun to resume
+    python -m app.importer --owner-id 42 --format csv - < tasks.csv
+
+Input is decoded and parsed incrementally and each row is validated with
+schemas.TaskImport. Valid rows are loaded IMPORT_BATCH_SIZE at a time, with
+COPY on asyncpg, each batch in one transaction that also advances the import's
+checkpoint. Running an import again under the same import id skips the rows
+already consumed, so an interrupted import resumes after its last batch.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import uuid
+import codecs
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models, schemas
+from .cache import task_cache
+from .database import engine, async_session
+
+logger = logging.getLogger(__name__)
+
+# Valid rows loaded per transaction, and so per checkpoint
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+# Per-row errors listed in an import report; further failures are only counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+# Longest accepted input record, in characters; a longer one aborts the import
+IMPORT_MAX_ROW_SIZE = int(os.getenv("IMPORT_MAX_ROW_SIZE", str(1024 * 1024)))
+
+IMPORT_FORMATS = ("ndjson", "csv")
+IMPORT_ID_PATTERN = r"^[A-Za-z0-9._:-]{1,100}$"
+
+# A parsed input row, or why it could not be parsed
+Record = Tuple[Optional[dict], Optional[str]]
+
+
+class ImportFormatError(ValueError):
+    """Raised when the input cannot be read any further: bad encoding, an oversized row or no CSV header"""
+
+
+class ImportConflict(Exception):
+    """Raised when another run of the same import moved its checkpoint"""
+
+
+def _checked(text: str) -> str:
+    """Reject a row, or the unfinished start of one, longer than IMPORT_MAX_ROW_SIZE"""
+    if len(text) > IMPORT_MAX_ROW_SIZE:
+        raise ImportFormatError(f"Row longer than {IMPORT_MAX_ROW_SIZE} characters")
+    return text
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode UTF-8 chunks (a leading BOM is dropped) into lines without their line endings"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield _checked(line[:-1] if line.endswith("\r") else line)
+            _checked(pending)
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ImportFormatError("Input is not valid UTF-8")
+    if pending:
+        yield _checked(pending[:-1] if pending.endswith("\r") else pending)
+
+
+async def _ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield record, None
+        else:
+            yield None, "Expected a JSON object"
+
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    """Rows keyed by the header row; empty fields other than title are treated as missing"""
+    header = None
+    text = ""
+    async for line in lines:
+        text = f"{text}\n{line}" if text else line
+        # An odd number of quotes means a quoted field continues on the next line
+        if _checked(text).count('"') % 2:
+            continue
+        row, text = text, ""
+        if not row.strip():
+            continue
+        try:
+            fields = next(csv.reader([row]))
+        except csv.Error as e:
+            yield None, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [name.strip() for name in fields]
+            if "title" not in header:
+                raise ImportFormatError("CSV header must include a title column")
+            continue
+        if len(fields) != len(header):
+            yield None, f"Expected {len(header)} fields, got {len(fields)}"
+            continue
+        yield {name: value if value or name == "title" else None for name, value in zip(header, fields)}, None
+    if text:
+        yield None, "Unterminated quoted field"
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _task_row(record: dict, owner_id: int, now: datetime) -> dict:
+    """Validate one record into Task column values; ids and owners in the input are ignored"""
+    task = schemas.TaskImport(**record)
+    created_at = _utc(task.created_at) if task.created_at else now
+    return {
+        "title": task.title,
+        "description": task.description,
+        "completed": task.completed,
+        "owner_id": owner_id,
+        "created_at": created_at,
+        "updated_at": _utc(task.updated_at) if task.updated_at else created_at,
+    }
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+async def import_tasks(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    owner_id: int,
+    fmt: str = "ndjson",
+    import_id: Optional[str] = None,
+    on_progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """Load tasks for owner_id from NDJSON or CSV byte chunks; returns a report (schemas.TaskImportReport).
+
+    Rows are numbered from 1 in input order, not counting blank lines or the
+    CSV header. Invalid rows are reported and skipped; everything up to the
+    report's checkpoint is loaded and committed, even when a later error
+    (ImportFormatError, ImportConflict, a database error) ends the import.
+    """
+    import_id = import_id or uuid.uuid4().hex
+    done = await crud.start_import(db, owner_id, import_id)
+    report = {
+        "import_id": import_id,
+        "rows": 0,
+        "skipped": 0,
+        "imported": 0,
+        "failed": 0,
+        "checkpoint": done,
+        "errors": [],
+        "errors_truncated": False,
+    }
+    now = datetime.now(timezone.utc)
+    batch = []
+
+    async def flush():
+        if not await crud.import_tasks(db, owner_id, import_id, batch, report["checkpoint"], report["rows"]):
+            raise ImportConflict(f"Import {import_id} is being run concurrently")
+        report["imported"] += len(batch)
+        report["checkpoint"] = report["rows"]
+        batch.clear()
+        await task_cache.invalidate(owner_id)
+        logger.info(
+            "Import %s for user %s at row %s: %s imported, %s failed",
+            import_id, owner_id, report["rows"], report["imported"], report["failed"]
+        )
+        if on_progress is not None:
+            on_progress(report)
+
+    lines = _lines(chunks)
+    records = _csv_records(lines) if fmt == "csv" else _ndjson_records(lines)
+    try:
+        async for record, error in records:
+            report["rows"] += 1
+            if report["rows"] <= done:
+                report["skipped"] += 1
+                continue
+            if error is None:
+                try:
+                    batch.append(_task_row(record, owner_id, now))
+                except ValidationError as e:
+                    error = _describe(e)
+            if error is not None:
+                report["failed"] += 1
+                if len(report["errors"]) < IMPORT_MAX_ERRORS:
+                    report["errors"].append({"row": report["rows"], "detail": error})
+                else:
+                    report["errors_truncated"] = True
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+    except ImportFormatError as e:
+        raise ImportFormatError(f"{e} (after row {report['rows']}; rows up to {report['checkpoint']} were loaded)")
+    # Also records trailing invalid rows as consumed, so a rerun does not report them again
+    if report["rows"] > report["checkpoint"]:
+        await flush()
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="NDJSON or CSV file, or - for stdin")
+    parser.add_argument("--owner-id", type=int, required=True, help="User the tasks are created for")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Input format (default: from the file extension, else ndjson)")
+    parser.add_argument("--import-id", help="Checkpoint name; rerun with the same id to resume (default: a new id)")
+    return parser.parse_args()
+
+
+async def _read(path: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    with (open(path, "rb") if path != "-" else sys.stdin.buffer) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _print_progress(report: dict):
+    print(
+        f"row {report['rows']}: {report['imported']} imported, {report['failed']} failed",
+        file=sys.stderr
+    )
+
+
+async def run(args) -> dict:
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    try:
+        async with async_session() as session:
+            return await import_tasks(
+                session, _read(args.path), args.owner_id, args.format, args.import_id, on_progress=_print_progress
+            )
+    finally:
+        await engine.dispose()
+
+
+def main():
+    args = parse_args()
+    if args.format is None:
+        args.format = "csv" if args.path.lower().endswith(".csv") else "ndjson"
+    if args.import_id is not None and not re.match(IMPORT_ID_PATTERN, args.import_id):
+        sys.exit("--import-id may only contain letters, digits and . _ : - (at most 100)")
+    args.import_id = args.import_id or uuid.uuid4().hex
+    print(f"Import id {args.import_id}; rerun with --import-id {args.import_id} to resume", file=sys.stderr)
+    try:
+        report = asyncio.run(run(args))
+    except (ImportFormatError, ImportConflict) as e:
+        sys.exit(f"Import stopped: {e}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
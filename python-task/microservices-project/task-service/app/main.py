@@ -1,16 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
+import os
 import logging
 
-from . import crud, models, schemas
+from . import crud, models, schemas, metrics, tracing, logging_config, deadline
 from .database import engine, get_db
+from .logging_config import SAMPLED
+from .pagination import encode_cursor, decode_cursor
+from .cache import task_cache, warn_if_process_local
+from .etags import CACHE_CONTROL, list_etag, content_etag, task_etag, etag_matches
+from .export import export_tasks, EXPORT_FORMATS
+from .importer import import_tasks, ImportConflict, ImportFormatError, IMPORT_ID_PATTERN
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Task Service", version="1.0.0")
+deadline.install(app)
+metrics.install(app)
+metrics.instrument_engine(engine)
+tracing.install(app, "task-service")
+logging_config.install(app, "task-service")
+tracing.instrument_engine(engine)
+
+# Serializers used to cache response bodies as bytes
+task_list_adapter = TypeAdapter(List[schemas.TaskResponse])
+task_adapter = TypeAdapter(schemas.TaskResponse)
+
+def json_response(body: bytes, headers: Optional[dict] = None, cache_status: str = "MISS") -> Response:
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**(headers or {}), "Cache-Control": CACHE_CONTROL, "X-Cache": cache_status}
+    )
+
+def not_modified(headers: dict) -> Response:
+    """304 carrying the validators and metadata the full response would have had"""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={**headers, "Cache-Control": CACHE_CONTROL}
+    )
+
+# Maximum items per batch request
+BATCH_MAX_CREATE = int(os.getenv("BATCH_MAX_CREATE", "500"))
+BATCH_MAX_UPDATE = int(os.getenv("BATCH_MAX_UPDATE", "500"))
+BATCH_MAX_DELETE = int(os.getenv("BATCH_MAX_DELETE", "1000"))
+# Maximum results per search page
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+# Longest per-day history returned by /tasks/stats
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "366"))
 
 @app.on_event("startup")
 async def create_tables():
@@ -19,6 +60,11 @@ async def create_tables():
         await conn.run_sync(models.Base.metadata.create_all)
     logger.info("Database tables created successfully")
 
+@app.on_event("startup")
+async def check_cache_backend():
+    """Warn when the response cache cannot be shared across replicas"""
+    warn_if_process_local()
+
 async def get_user_id_from_header(x_user_id: Optional[str] = Header(None)) -> int:
     """Extract user ID from header (set by gateway)"""
     if not x_user_id:
@@ -34,6 +80,37 @@ async def get_user_id_from_header(x_user_id: Optional[str] = Header(None)) -> in
             detail="Invalid user ID"
         )
 
+def check_batch_size(size: int, limit: int):
+    """Reject empty or oversized batches before touching the database"""
+    if size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch is empty"
+        )
+    if size > limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch too large: {size} items (max {limit})"
+        )
+
+def missing_or_forbidden(task_id: int, owner_id: Optional[int], action: str) -> dict:
+    """Per-item result for a task that was not found or belongs to someone else"""
+    if owner_id is None:
+        return dict(id=task_id, status=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    return dict(id=task_id, status=status.HTTP_403_FORBIDDEN, detail=f"Not authorized to {action} this task")
+
+async def ownership_error(db: AsyncSession, task_id: int, action: str) -> HTTPException:
+    """Explain why an owner-scoped write matched no row: missing task or someone else's"""
+    if await crud.get_task_owner(db, task_id) is None:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Not authorized to {action} this task"
+    )
+
 @app.post("/tasks", response_model=schemas.TaskResponse)
 async def create_task(
     task: schemas.TaskCreate,
@@ -43,10 +120,11 @@ async def create_task(
     """Create a new task"""
     try:
         db_task = await crud.create_task(db, task, user_id)
-        logger.info(f"Task created successfully: {db_task.id} for user {user_id}")
+        await task_cache.invalidate(user_id)
+        logger.info("Task created successfully: %s for user %s", db_task.id, user_id, extra=SAMPLED)
         return db_task
     except Exception as e:
-        logger.error(f"Error creating task: {str(e)}")
+        logger.error("Error creating task: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -56,15 +134,265 @@ async def create_task(
 async def get_tasks(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(get_user_id_from_header)
+):
+    """Get tasks for the current user, newest first.
+
+    Pass the X-Next-Cursor header of one page as ?cursor= to fetch the next.
+    Responses carry an ETag; a matching If-None-Match gets a 304 without
+    touching the database.
+    """
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
+    cache_name = f"list:{skip}:{limit}:{cursor or ''}"
+    try:
+        version, cached = await task_cache.get(user_id, cache_name)
+        etag = list_etag(user_id, version, cache_name) if version is not None else None
+        if etag_matches(if_none_match, etag):
+            return not_modified(cached.headers if cached is not None else {"ETag": etag})
+        if cached is not None:
+            return json_response(cached.body, cached.headers, "HIT")
+        
+        tasks = await crud.get_user_tasks(db, user_id, skip, limit, cursor=position)
+        headers = {}
+        if tasks and len(tasks) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(tasks[-1].created_at, tasks[-1].id)
+        body = task_list_adapter.dump_json(tasks)
+        headers["ETag"] = etag or content_etag(body)
+        if etag_matches(if_none_match, headers["ETag"]):
+            return not_modified(headers)
+        await task_cache.set(user_id, version, cache_name, body, headers)
+        return json_response(body, headers)
+    except Exception as e:
+        logger.error("Error retrieving tasks: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@app.post("/tasks/batch", response_model=schemas.TaskBatchResponse)
+async def create_tasks_batch(
+    batch: schemas.TaskBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(get_user_id_from_header)
+):
+    """Create many tasks in one transaction"""
+    check_batch_size(len(batch.tasks), BATCH_MAX_CREATE)
+    try:
+        created = await crud.create_tasks(db, batch.tasks, user_id)
+        await task_cache.invalidate(user_id)
+        logger.info("Batch created %s tasks for user %s", len(created), user_id, extra=SAMPLED)
+        return {
+            "results": [
+                {"index": index, "id": task.id, "status": status.HTTP_200_OK, "task": task}
+                for index, task in enumerate(created)
+            ]
+        }
+    except Exception as e:
+        logger.error("Error creating task batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@app.patch("/tasks/batch", response_model=schemas.TaskBatchResponse)
+async def update_tasks_batch(
+    batch: schemas.TaskBatchUpdate,
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(get_user_id_from_header)
+):
+    """Update many tasks in one transaction, reporting a status per item"""
+    check_batch_size(len(batch.tasks), BATCH_MAX_UPDATE)
+    try:
+        owners, updated = await crud.update_tasks(db, batch.tasks, user_id)
+        if updated:
+            await task_cache.invalidate(user_id)
+        results = []
+        for index, item in enumerate(batch.tasks):
+            if item.id in updated:
+                results.append({"index": index, "id": item.id, "status": status.HTTP_200_OK, "task": updated[item.id]})
+            else:
+                results.append({"index": index, **missing_or_forbidden(item.id, owners.get(item.id), "update")})
+        logger.info("Batch updated %s of %s tasks for user %s", len(updated), len(batch.tasks), user_id, extra=SAMPLED)
+        return {"results": results}
+    except Exception as e:
+        logger.error("Error updating task batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@app.delete("/tasks/batch", response_model=schemas.TaskBatchResponse)
+async def delete_tasks_batch(
+    batch: schemas.TaskBatchDelete,
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_header)
 ):
-    """Get all tasks for the current user"""
+    """Delete many tasks in one statement, reporting a status per item"""
+    check_batch_size(len(batch.ids), BATCH_MAX_DELETE)
     try:
-        tasks = await crud.get_user_tasks(db, user_id, skip, limit)
-        return tasks
+        deleted = await crud.delete_tasks(db, batch.ids, user_id)
+        if deleted:
+            await task_cache.invalidate(user_id)
+        # Only ids that were not deleted need a lookup to tell 404 from 403
+        failed = [task_id for task_id in batch.ids if task_id not in deleted]
+        owners = await crud.get_task_owners(db, failed) if failed else {}
+        results = []
+        for index, task_id in enumerate(batch.ids):
+            if task_id in deleted:
+                results.append({"index": index, "id": task_id, "status": status.HTTP_200_OK})
+            else:
+                results.append({"index": index, **missing_or_forbidden(task_id, owners.get(task_id), "delete")})
+        logger.info("Batch deleted %s of %s tasks for user %s", len(deleted), len(batch.ids), user_id, extra=SAMPLED)
+        return {"results": results}
     except Exception as e:
-        logger.error(f"Error retrieving tasks: {str(e)}")
+        logger.error("Error deleting task batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+# Declared before /tasks/{task_id} so "export", "import", "stats" and "search" are not parsed as task ids
+@app.get("/tasks/export")
+async def export_user_tasks(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    user_id: int = Depends(get_user_id_from_header)
+):
+    """Stream all of the current user's tasks, oldest first, as NDJSON or CSV in constant memory"""
+    media_type, extension = EXPORT_FORMATS[fmt]
+    return StreamingResponse(
+        export_tasks(user_id, fmt),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="tasks.{extension}"',
+            "Cache-Control": "no-store",
+        }
+    )
+
+@app.post("/tasks/import", response_model=schemas.TaskImportReport)
+async def import_user_tasks(
+    request: Request,
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    import_id: Optional[str] = Query(None, pattern=IMPORT_ID_PATTERN),
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(get_user_id_from_header)
+):
+    """Bulk-load tasks for the current user from an NDJSON or CSV request body.
+
+    The body is parsed as it arrives and loaded in batches, one transaction
+    each; the report lists rows that failed validation. Retrying with the same
+    import_id resumes after the last loaded batch.
+    """
+    try:
+        report = await import_tasks(db, request.stream(), user_id, fmt, import_id)
+    except ImportFormatError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except ImportConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Error importing tasks: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+    logger.info(
+        "Import %s for user %s finished: %s imported, %s failed, %s skipped",
+        report["import_id"], user_id, report["imported"], report["failed"], report["skipped"]
+    )
+    return report
+
+@app.get("/tasks/stats", response_model=schemas.TaskStatsResponse)
+async def get_task_stats(
+    days: int = Query(30, ge=1),
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(get_user_id_from_header)
+):
+    """Task counts for the current user and tasks created per UTC day over the last `days` days.
+
+    Served from counters kept up to date by every task write, so the cost does
+    not depend on how many tasks the user has.
+    """
+    since = datetime.now(timezone.utc).date() - timedelta(days=min(days, STATS_MAX_DAYS) - 1)
+    try:
+        stats, daily = await crud.get_task_stats(db, user_id, since)
+    except Exception as e:
+        logger.error("Error retrieving task stats: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+    total = stats.total if stats is not None else 0
+    completed = stats.completed if stats is not None else 0
+    return {
+        "total": total,
+        "completed": completed,
+        "open": total - completed,
+        "created_per_day": [{"date": row.day, "created": row.created} for row in daily if row.created],
+    }
+
+@app.get("/tasks/search", response_model=List[schemas.TaskResponse])
+async def search_tasks(
+    q: Optional[str] = Query(None, max_length=200),
+    completed: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    limit: int = Query(50, ge=1),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(get_user_id_from_header)
+):
+    """Search the current user's tasks by text in title/description and by state and date ranges.
+
+    Results are newest first; pass the X-Next-Cursor header of one page as
+    ?cursor= to fetch the next.
+    """
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    limit = min(limit, SEARCH_MAX_LIMIT)
+    
+    try:
+        tasks = await crud.search_tasks(
+            db, user_id, q,
+            completed=completed,
+            created_after=created_after,
+            created_before=created_before,
+            updated_after=updated_after,
+            updated_before=updated_before,
+            limit=limit,
+            cursor=position,
+        )
+        headers = {}
+        if tasks and len(tasks) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(tasks[-1].created_at, tasks[-1].id)
+        return json_response(task_list_adapter.dump_json(tasks), headers, "BYPASS")
+    except Exception as e:
+        logger.error("Error searching tasks: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -73,11 +401,19 @@ async def get_tasks(
 @app.get("/tasks/{task_id}", response_model=schemas.TaskResponse)
 async def get_task(
     task_id: int,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     user_id: int = Depends(get_user_id_from_header)
 ):
-    """Get a specific task"""
+    """Get a specific task, honoring If-None-Match"""
+    cache_name = f"task:{task_id}"
     try:
+        version, cached = await task_cache.get(user_id, cache_name)
+        if cached is not None:
+            if etag_matches(if_none_match, cached.headers.get("ETag")):
+                return not_modified(cached.headers)
+            return json_response(cached.body, cached.headers, "HIT")
+        
         task = await crud.get_task(db, task_id)
         if not task:
             raise HTTPException(
@@ -92,11 +428,16 @@ async def get_task(
                 detail="Not authorized to access this task"
             )
         
-        return task
+        headers = {"ETag": task_etag(task)}
+        if etag_matches(if_none_match, headers["ETag"]):
+            return not_modified(headers)
+        body = task_adapter.dump_json(task)
+        await task_cache.set(user_id, version, cache_name, body, headers)
+        return json_response(body, headers)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving task: {str(e)}")
+        logger.error("Error retrieving task: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -111,28 +452,18 @@ async def update_task(
 ):
     """Update a task"""
     try:
-        # Check if task exists and belongs to user
-        existing_task = await crud.get_task(db, task_id)
-        if not existing_task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found"
-            )
+        # Ownership check and update in one statement
+        updated_task = await crud.update_task(db, task_id, user_id, task_update)
+        if updated_task is None:
+            raise await ownership_error(db, task_id, "update")
+        await task_cache.invalidate(user_id)
         
-        if existing_task.owner_id != user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized to update this task"
-            )
-        
-        # Update task
-        updated_task = await crud.update_task(db, task_id, task_update)
-        logger.info(f"Task updated successfully: {task_id}")
+        logger.info("Task updated successfully: %s", task_id, extra=SAMPLED)
         return updated_task
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating task: {str(e)}")
+        logger.error("Error updating task: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -146,28 +477,17 @@ async def delete_task(
 ):
     """Delete a task"""
     try:
-        # Check if task exists and belongs to user
-        existing_task = await crud.get_task(db, task_id)
-        if not existing_task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Task not found"
-            )
-        
-        if existing_task.owner_id != user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized to delete this task"
-            )
+        # Ownership check and delete in one statement
+        if not await crud.delete_task(db, task_id, user_id):
+            raise await ownership_error(db, task_id, "delete")
+        await task_cache.invalidate(user_id)
         
-        # Delete task
-        await crud.delete_task(db, task_id)
-        logger.info(f"Task deleted successfully: {task_id}")
+        logger.info("Task deleted successfully: %s", task_id, extra=SAMPLED)
         return {"message": "Task deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting task: {str(e)}")
+        logger.error("Error deleting task: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -177,3 +497,8 @@ async def delete_task(
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "task-service"}
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Response cache hit ratio and error counters"""
+    return task_cache.stats()
@@ -1,9 +1,19 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, Date, DateTime, ForeignKey, Index, literal
+from sqlalchemy.dialects import postgresql, sqlite  # postgresql registers typed to_tsvector()
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# SQLite's CURRENT_TIMESTAMP has second resolution; bind values in the same
+# format so server defaults and cursor parameters compare consistently
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite",
+)
+
 class Task(Base):
     __tablename__ = "tasks"
     
@@ -12,6 +22,54 @@ class Task(Base):
     description = Column(Text, nullable=True)
     completed = Column(Boolean, default=False)
     owner_id = Column(Integer, nullable=False, index=True)  # Foreign key to user
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
-    
\ No newline at end of file
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
+    
+    # Load server-generated timestamps with RETURNING at flush, so task stats
+    # can be updated in the same transaction as the insert
+    __mapper_args__ = {"eager_defaults": True}
+
+class TaskStats(Base):
+    """Per-user task counters, maintained by crud in the same transaction as task writes"""
+    __tablename__ = "task_stats"
+    
+    owner_id = Column(Integer, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+
+class TaskDailyStats(Base):
+    """Per-user count of existing tasks by UTC creation day"""
+    __tablename__ = "task_daily_stats"
+    
+    owner_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    created = Column(Integer, nullable=False, default=0)
+
+class ImportCheckpoint(Base):
+    """Input rows consumed by a named bulk import, advanced in the same transaction as each loaded batch"""
+    __tablename__ = "task_imports"
+    
+    owner_id = Column(Integer, primary_key=True)
+    import_id = Column(String(100), primary_key=True)
+    rows = Column(Integer, nullable=False, default=0)
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
+
+# Serves newest-first listing and keyset pagination per owner
+Index("ix_tasks_owner_created_id", Task.owner_id, Task.created_at.desc(), Task.id.desc())
+# Serves listing and search filtered on completion state
+Index("ix_tasks_owner_completed_created_id", Task.owner_id, Task.completed, Task.created_at.desc(), Task.id.desc())
+
+# Text search configuration for the Postgres tsvector index
+SEARCH_CONFIG = "english"
+
+# Searchable text of a task. Queries must use this exact expression, with its
+# constants rendered inline, for Postgres to match it against the expression index.
+search_document = func.to_tsvector(
+    literal(SEARCH_CONFIG, literal_execute=True),
+    func.coalesce(Task.title, literal("", literal_execute=True))
+    .op("||")(literal(" ", literal_execute=True))
+    .op("||")(func.coalesce(Task.description, literal("", literal_execute=True))),
+)
+
+# GIN index for full-text search; SQLite falls back to LIKE scans (see crud.search_tasks)
+Index("ix_tasks_search", search_document, postgresql_using="gin").ddl_if(dialect="postgresql")
@@ -0,0 +1,23 @@
+import json
+import base64
+from datetime import datetime
+from typing import Tuple
+
+# A keyset position: the (created_at, id) of the last task on the previous page
+Cursor = Tuple[datetime, int]
+
+
+def encode_cursor(created_at: datetime, task_id: int) -> str:
+    """Encode a keyset position as an opaque URL-safe token"""
+    raw = json.dumps([created_at.isoformat(), task_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decode a token produced by encode_cursor; raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
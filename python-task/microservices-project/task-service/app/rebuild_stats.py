@@ -0,0 +1,39 @@
+"""Recompute task_stats and task_daily_stats from the tasks table.
+
+    python -m app.rebuild_stats              # every user
+    python -m app.rebuild_stats --owner-id 42
+
+Run once after upgrading an existing database, or to repair drift. Counters
+are otherwise kept current by the task write paths in crud.
+"""
+import asyncio
+import argparse
+
+from . import crud, models
+from .database import engine, async_session
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--owner-id", type=int, help="Rebuild a single user's stats")
+    return parser.parse_args()
+
+
+async def rebuild(owner_id=None) -> int:
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    try:
+        async with async_session() as session:
+            return await crud.rebuild_task_stats(session, owner_id)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    args = parse_args()
+    rebuilt = asyncio.run(rebuild(args.owner_id))
+    print(f"Rebuilt task stats for {rebuilt} user(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, validator
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 
 class TaskBase(BaseModel):
     title: str
@@ -38,4 +38,56 @@ class TaskResponse(TaskBase):
     updated_at: datetime
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class TaskBatchCreate(BaseModel):
+    tasks: List[TaskCreate]
+
+class TaskBatchUpdateItem(TaskUpdate):
+    id: int
+
+class TaskBatchUpdate(BaseModel):
+    tasks: List[TaskBatchUpdateItem]
+
+class TaskBatchDelete(BaseModel):
+    ids: List[int]
+
+class TaskBatchItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: int
+    task: Optional[TaskResponse] = None
+    detail: Optional[str] = None
+
+class TaskBatchResponse(BaseModel):
+    results: List[TaskBatchItemResult]
+
+class TaskDayCount(BaseModel):
+    date: date
+    created: int
+
+class TaskStatsResponse(BaseModel):
+    total: int
+    completed: int
+    open: int
+    created_per_day: List[TaskDayCount]
+
+class TaskImport(TaskCreate):
+    """One imported row; state and timestamps are kept when present (e.g. from /tasks/export)"""
+    completed: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class TaskImportError(BaseModel):
+    row: int
+    detail: str
+
+class TaskImportReport(BaseModel):
+    import_id: str
+    rows: int
+    skipped: int
+    imported: int
+    failed: int
+    checkpoint: int
+    errors: List[TaskImportError]
+    errors_truncated: bool
@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# Settings are read with os.getenv when each module is imported, so .env must be
+# loaded before any of them; variables already set in the environment take precedence
+load_dotenv()
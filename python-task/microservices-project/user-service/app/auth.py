@@ -2,10 +2,12 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from . import models, crud
+from . import models, crud, schemas
+from .cache import user_cache
 from .database import get_db
 
 # JWT settings
@@ -13,6 +15,11 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Put profile fields (email, created_at, is_active) in access tokens so /users/me?source=token
+# can answer from verified claims. Off by default: every service that sees the token then sees
+# the email, and is_active stays as issued until the token expires.
+ALLOW_TOKEN_PROFILE = os.getenv("ALLOW_TOKEN_PROFILE", "false").lower() in ("1", "true", "yes")
+
 security = HTTPBearer()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -26,11 +33,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> models.User:
-    """Get current user from JWT token"""
+def profile_claims(user: models.User) -> dict:
+    """Token claims identifying a user, plus their public profile when ALLOW_TOKEN_PROFILE is set"""
+    claims = {"sub": user.username, "user_id": user.id}
+    if ALLOW_TOKEN_PROFILE:
+        claims.update(
+            email=user.email,
+            created_at=user.created_at.isoformat(),
+            is_active=user.is_active,
+        )
+    return claims
+
+def decode_credentials(credentials: HTTPAuthorizationCredentials) -> dict:
+    """Verify the bearer token and return its claims"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -38,19 +53,55 @@ async def get_current_user(
     )
     
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: int = payload.get("user_id")
-        if username is None or user_id is None:
-            raise credentials_exception
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise credentials_exception
-    
-    user = await crud.get_user_by_username(db, username)
-    if user is None:
+    if payload.get("sub") is None or payload.get("user_id") is None:
         raise credentials_exception
-    return user
+    return payload
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> schemas.UserResponse:
+    """Get current user from JWT token, served from the profile cache when possible"""
+    payload = decode_credentials(credentials)
+    username: str = payload.get("sub")
+    user_id: int = payload.get("user_id")
+    
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    db_user = await crud.get_user_by_id(db, user_id)
+    if db_user is None or db_user.username != username:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_cache.put(db_user)
+
+async def get_current_user_profile(
+    source: Optional[str] = Query(None, description="Set to 'token' to answer from verified token claims"),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> schemas.UserResponse:
+    """Get the current user's profile, optionally without touching the user store"""
+    if source == "token" and ALLOW_TOKEN_PROFILE:
+        payload = decode_credentials(credentials)
+        try:
+            return schemas.UserResponse(
+                id=payload["user_id"],
+                username=payload["sub"],
+                email=payload["email"],
+                created_at=payload["created_at"],
+                is_active=payload["is_active"],
+            )
+        except (KeyError, ValidationError):
+            # Token issued without profile claims; fall back to the cache/DB
+            pass
+    return await get_current_user(credentials, db)
 
 def verify_token(token: str) -> dict:
     """Verify JWT token and return payload"""
@@ -0,0 +1,100 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import models, schemas
+from .metrics import registry
+
+# User profile cache settings
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+class UserCache:
+    """In-process TTL + LRU cache of user profiles keyed by user_id"""
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[schemas.UserResponse, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[schemas.UserResponse]:
+        """Return a cached profile, or None if absent or expired"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return user
+
+    def put(self, db_user: models.User) -> schemas.UserResponse:
+        """Snapshot a user row into the cache and return the snapshot"""
+        user = schemas.UserResponse.model_validate(db_user)
+        if self.max_size <= 0:
+            return user
+        self._entries[user.id] = (user, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = UserCache()
+
+
+# Invalidate on any ORM change to a user: once at flush, and again at commit in
+# case a concurrent request re-cached the old row in between
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _mark_user_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_ids", set()).add(target.id)
+    user_cache.invalidate(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+
+registry.callback(
+    "user_cache_lookups_total",
+    "User profile cache lookups",
+    ("result",),
+    lambda: {("hit",): user_cache.hits, ("miss",): user_cache.misses},
+    type="counter",
+)
@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from passlib.context import CryptContext
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Password hashing pool settings
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread").lower()  # thread | process
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+# Requests allowed to wait for a worker before new ones are rejected
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "64"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))
+# bcrypt cost factor for new hashes; existing hashes keep verifying at their own cost
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+HASH_DURATION = registry.histogram(
+    "hash_duration_seconds", "Time a bcrypt hash or verify ran on a worker", ("operation",)
+)
+HASH_QUEUE_WAIT = registry.histogram(
+    "hash_queue_wait_seconds", "Time a hashing job waited for a free worker", ("operation",)
+)
+
+
+class HasherOverloaded(Exception):
+    """Raised when the hashing queue is full and the request should be shed"""
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool with queue-depth backpressure"""
+
+    def __init__(self, kind: str = HASH_POOL_KIND, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(workers)
+        self._pending = 0
+        # Metrics
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                # bcrypt releases the GIL, so threads hash in parallel
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            logger.info("Password hasher started: %s pool, %s workers, rounds=%s", self.kind, self.workers, BCRYPT_ROUNDS)
+        return self._executor
+
+    async def _run(self, operation: str, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherOverloaded()
+
+        self._pending += 1
+        queued_at = time.perf_counter()
+        try:
+            async with self._slots:
+                started_at = time.perf_counter()
+                wait = started_at - queued_at
+                HASH_QUEUE_WAIT.observe(wait, operation)
+                result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+                elapsed = time.perf_counter() - started_at
+        finally:
+            self._pending -= 1
+
+        HASH_DURATION.observe(elapsed, operation)
+        self.completed += 1
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        self.hash_seconds_total += elapsed
+        self.hash_seconds_max = max(self.hash_seconds_max, elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", _verify, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "in_flight": min(self._pending, self.workers),
+            "queued": max(self._pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "hash_seconds_avg": self.hash_seconds_total / self.completed if self.completed else 0.0,
+            "hash_seconds_max": self.hash_seconds_max,
+            "wait_seconds_avg": self.wait_seconds_total / self.completed if self.completed else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+hasher = PasswordHasher()
+
+registry.callback(
+    "password_hash_pool_tasks",
+    "Password hashing jobs running or waiting for a worker",
+    ("state",),
+    lambda: {("running",): min(hasher._pending, hasher.workers), ("queued",): max(hasher._pending - hasher.workers, 0)},
+)
+registry.callback(
+    "password_hash_jobs_total",
+    "Password hashing jobs by outcome",
+    ("outcome",),
+    lambda: {("completed",): hasher.completed, ("rejected",): hasher.rejected},
+    type="counter",
+)
@@ -0,0 +1,238 @@
+"""Structured logging shared by the gateway, user-service and task-service.
+
+Each service is built from its own Docker context, so every service carries an
+identical copy of this module; change them together.
+
+Records are put on a bounded in-memory queue by the thread that logs them and
+formatted and written by a background thread, so the event loop never blocks
+on stdout. When the queue is full, records are dropped and counted.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from fastapi import FastAPI
+
+from . import tracing
+from .metrics import registry
+
+# Logging settings
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json | text
+# Records buffered for the writer thread; further records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of routine success records (access lines, "... successfully") that are kept
+LOG_SUCCESS_SAMPLE_RATIO = float(os.getenv("LOG_SUCCESS_SAMPLE_RATIO", "1.0"))
+# Requests slower than this are always logged, whatever the sample ratio
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Pass as extra= on high-volume success records to subject them to sampling
+SAMPLED = {"sampled": True}
+
+LOGS_DROPPED = registry.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+# Per-request fields (request_id, user_id, ...) added to every record logged while handling it
+_context: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("log_context", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "context", "sampled"}
+
+
+def bind(**fields):
+    """Add fields to the current request's log context, e.g. the user id once authenticated"""
+    context = _context.get()
+    if context is not None:
+        context.update((key, value) for key, value in fields.items() if value is not None)
+
+
+def request_id() -> Optional[str]:
+    context = _context.get()
+    return context.get("request_id") if context is not None else None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request context and extra fields"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "service": self.service,
+        }
+        entry.update(getattr(record, "context", None) or {})
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text for local development, with the request id when there is one"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = getattr(record, "context", None)
+        if context and "request_id" in context:
+            line += f" [request_id={context['request_id']}]"
+        return line
+
+
+class SuccessSampler(logging.Filter):
+    """Keep only a fraction of records logged with extra=SAMPLED"""
+
+    def __init__(self, ratio: float = LOG_SUCCESS_SAMPLE_RATIO):
+        super().__init__()
+        self.ratio = ratio
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.ratio >= 1:
+            return True
+        return random.random() < self.ratio
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue records without formatting them, and drop rather than wait when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Capture request context on the logging thread; message formatting is
+        # left to the listener thread
+        context = _context.get()
+        trace = tracing.current_context()
+        if context is not None or trace is not None:
+            record.context = dict(context or {})
+            if trace is not None:
+                record.context["trace_id"] = trace.trace_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGS_DROPPED.inc()
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(service: str):
+    """Route the root logger (and uvicorn's) through the queue to a JSON or text stdout writer"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter(os.getenv("SERVICE_NAME", service)))
+
+    handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(SuccessSampler())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    # Replaced by the structured access records of RequestLogMiddleware
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+access_logger = logging.getLogger("access")
+
+
+class RequestLogMiddleware:
+    """Pure ASGI middleware binding a request context and writing one access record per request.
+
+    The request id comes from X-Request-Id or is generated, and is echoed on the
+    response. X-User-Id is only trusted behind the gateway (trust_user_header).
+    Successful, fast requests are logged with extra=SAMPLED.
+    """
+
+    def __init__(self, app, trust_user_header: bool = True):
+        self.app = app
+        self.trust_user_header = trust_user_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        rid = headers.get(REQUEST_ID_HEADER.encode("latin-1"), b"").decode("latin-1")[:128] or os.urandom(8).hex()
+        context = {"request_id": rid}
+        user_id = headers.get(b"x-user-id") if self.trust_user_header else None
+        if user_id:
+            context["user_id"] = user_id.decode("latin-1")
+        token = _context.set(context)
+
+        started = time.perf_counter()
+        status_code = 500
+        trace = None
+
+        async def send_with_request_id(message):
+            nonlocal status_code, trace
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                trace = tracing.current_context()
+                # Proxied responses may already carry the id from the upstream
+                response_headers = list(message.get("headers", []))
+                if not any(name.lower() == REQUEST_ID_HEADER.encode("latin-1") for name, _ in response_headers):
+                    response_headers.append((REQUEST_ID_HEADER.encode("latin-1"), rid.encode("latin-1")))
+                message["headers"] = response_headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            route = scope.get("metrics_route")
+            if route is None:
+                matched = scope.get("route")
+                route = matched.path if matched is not None else scope["path"]
+            if trace is not None:
+                context["trace_id"] = trace.trace_id
+            extra = {"method": scope["method"], "route": route, "status": status_code, "duration_ms": round(duration_ms, 3)}
+            if status_code < 400 and duration_ms < LOG_SLOW_REQUEST_MS:
+                extra.update(SAMPLED)
+            level = logging.ERROR if status_code >= 500 else logging.INFO
+            access_logger.log(level, "%s %s %s", scope["method"], scope["path"], status_code, extra=extra)
+            _context.reset(token)
+
+
+def install(app: FastAPI, service: str, trust_user_header: bool = True):
+    """Set up queued structured logging and add the request log middleware to an app"""
+    setup_logging(service)
+    app.add_middleware(RequestLogMiddleware, trust_user_header=trust_user_header)
@@ -3,14 +3,20 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import logging
 
-from . import crud, models, schemas, auth
+from . import crud, models, schemas, metrics, tracing, logging_config, deadline, auth
 from .database import engine, get_db
+from .logging_config import SAMPLED
+from .hashing import hasher, HasherOverloaded, HASH_RETRY_AFTER
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="User Service", version="1.0.0")
+deadline.install(app)
+metrics.install(app)
+metrics.instrument_engine(engine)
+tracing.install(app, "user-service")
+logging_config.install(app, "user-service")
+tracing.instrument_engine(engine)
 
 @app.on_event("startup")
 async def create_tables():
@@ -19,6 +25,18 @@ async def create_tables():
         await conn.run_sync(models.Base.metadata.create_all)
     logger.info("Database tables created successfully")
 
+@app.on_event("shutdown")
+async def stop_hasher():
+    """Stop the password hashing pool on shutdown"""
+    hasher.shutdown()
+
+def hasher_overloaded_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent password operations, retry shortly",
+        headers={"Retry-After": str(HASH_RETRY_AFTER)},
+    )
+
 @app.post("/register", response_model=schemas.UserResponse)
 async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
@@ -40,12 +58,15 @@ async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db))
         
         # Create new user
         db_user = await crud.create_user(db, user)
-        logger.info(f"User registered successfully: {user.username}")
+        logger.info("User registered successfully: %s", user.username, extra=SAMPLED)
         return db_user
     except HTTPException:
         raise
+    except HasherOverloaded:
+        logger.warning("Registration rejected, hashing pool saturated: %s", user.username)
+        raise hasher_overloaded_exception()
     except Exception as e:
-        logger.error(f"Error registering user: {str(e)}")
+        logger.error("Error registering user: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -65,24 +86,32 @@ async def login(user_credentials: schemas.UserLogin, db: AsyncSession = Depends(
             )
         
         # Create access token
-        access_token = auth.create_access_token(data={"sub": user.username, "user_id": user.id})
-        logger.info(f"User logged in successfully: {user.username}")
+        access_token = auth.create_access_token(data=auth.profile_claims(user))
+        logger.info("User logged in successfully: %s", user.username, extra=SAMPLED)
         return {"access_token": access_token, "token_type": "bearer"}
     except HTTPException:
         raise
+    except HasherOverloaded:
+        logger.warning("Login rejected, hashing pool saturated: %s", user_credentials.username)
+        raise hasher_overloaded_exception()
     except Exception as e:
-        logger.error(f"Error during login: {str(e)}")
+        logger.error("Error during login: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
         )
 
 @app.get("/users/me", response_model=schemas.UserResponse)
-async def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
+async def get_current_user_info(current_user: schemas.UserResponse = Depends(auth.get_current_user_profile)):
     """Get current user information"""
     return current_user
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "user-service"}
\ No newline at end of file
+    return {"status": "healthy", "service": "user-service"}
+
+@app.get("/stats/hashing")
+async def hashing_stats():
+    """Password hashing pool latency, queue wait and rejection counters"""
+    return hasher.stats()
@@ -0,0 +1,372 @@
+"""W3C Trace Context tracing shared by the gateway, user-service and task-service.
+
+Each service is built from its own Docker context, so every service carries an
+identical copy of this module; change them together.
+
+Unsampled requests only carry a trace context for propagation: span() then
+returns a shared no-op object, so tracing costs a contextvar lookup per span.
+"""
+import os
+import json
+import time
+import random
+import logging
+import functools
+import threading
+import contextvars
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from fastapi import FastAPI
+
+logger = logging.getLogger(__name__)
+
+# Tracing settings
+# Fraction of new traces to record; requests with a traceparent follow the caller's decision
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()  # none | memory | file
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_MEMORY_LIMIT = int(os.getenv("TRACE_MEMORY_LIMIT", "10000"))
+# Longest SQL text kept on a span
+TRACE_SQL_MAX_LENGTH = int(os.getenv("TRACE_SQL_MAX_LENGTH", "500"))
+
+TRACEPARENT_HEADER = "traceparent"
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+def _is_hex(value: str) -> bool:
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parse a traceparent header (version-traceid-parentid-flags); None if malformed"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4:
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    if (
+        len(version) != 2 or version == "ff" or not _is_hex(version)
+        or len(trace_id) != 32 or not _is_hex(trace_id) or trace_id == "0" * 32
+        or len(span_id) != 16 or not _is_hex(span_id) or span_id == "0" * 16
+        or len(flags) != 2 or not _is_hex(flags)
+        # Version 00 defines exactly four fields
+        or (version == "00" and len(parts) != 4)
+    ):
+        return None
+    return SpanContext(trace_id.lower(), span_id.lower(), bool(int(flags, 16) & 0x01))
+
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+
+# Exporters
+
+class InMemoryExporter:
+    """Keeps the most recent finished spans in memory, for tests and local debugging"""
+
+    def __init__(self, limit: int = TRACE_MEMORY_LIMIT):
+        self.spans = deque(maxlen=limit)
+
+    def export(self, span: dict):
+        self.spans.append(span)
+
+    def find(self, trace_id: str) -> List[dict]:
+        return [span for span in self.spans if span["trace_id"] == trace_id]
+
+    def clear(self):
+        self.spans.clear()
+
+    def close(self):
+        pass
+
+
+class FileExporter:
+    """Appends finished spans to a JSON-lines file"""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: dict):
+        line = json.dumps(span, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def create_exporter(kind: str = TRACE_EXPORTER):
+    """Build the configured exporter; None disables recording entirely"""
+    if kind == "memory":
+        return InMemoryExporter()
+    if kind == "file":
+        return FileExporter()
+    return None
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_ratio: float = TRACE_SAMPLE_RATIO, service: str = "unknown"):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+        self.service = service
+
+    def set_exporter(self, exporter):
+        """Swap the sink spans are exported to, e.g. an InMemoryExporter in tests"""
+        if self.exporter is not None and self.exporter is not exporter:
+            self.exporter.close()
+        self.exporter = exporter
+
+    def should_sample(self) -> bool:
+        return self.exporter is not None and random.random() < self.sample_ratio
+
+    def export(self, span: dict):
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            logger.warning("Span export failed: %s", e)
+
+
+tracer = Tracer(create_exporter())
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("trace_context", default=None)
+
+
+def current_context() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def is_recording() -> bool:
+    context = _current.get()
+    return context is not None and context.sampled and tracer.exporter is not None
+
+
+class Span:
+    """A recorded unit of work; becomes the current span while used as a context manager"""
+
+    __slots__ = ("name", "context", "parent_id", "attributes", "status", "_started", "_start_time", "_token")
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str], attributes: Optional[dict] = None):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self._started = time.perf_counter()
+        self._start_time = time.time()
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if error is not None:
+            self.status = "error"
+            self.attributes.setdefault("error", f"{type(error).__name__}: {error}")
+        tracer.export({
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": tracer.service,
+            "start": self._start_time,
+            "duration_ms": (time.perf_counter() - self._started) * 1000,
+            "status": self.status,
+            "attributes": self.attributes,
+        })
+
+    def __enter__(self):
+        self._token = _current.set(self.context)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.end(exc)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def end(self, error: Optional[BaseException] = None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """Child of the current span, or a no-op when unsampled.
+
+    Use as a context manager to make it current, or call end() explicitly.
+    """
+    parent = _current.get()
+    if parent is None or not parent.sampled or tracer.exporter is None:
+        return NOOP_SPAN
+    return Span(name, SpanContext(parent.trace_id, _new_id(64), True), parent.span_id, attributes)
+
+
+def traced(func: Callable) -> Callable:
+    """Decorator recording a span named <module>.<function> around an async function"""
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not is_recording():
+            return await func(*args, **kwargs)
+        with span(name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def inject(headers: Dict[str, str], parent=None) -> Dict[str, str]:
+    """Add a traceparent for the given span (default: the current one) to outgoing request headers"""
+    context = parent.context if isinstance(parent, Span) else _current.get()
+    if context is not None:
+        headers[TRACEPARENT_HEADER] = format_traceparent(context)
+    return headers
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware starting a server span per request.
+
+    Continues an incoming traceparent (keeping the caller's sampling decision)
+    or starts a new trace sampled at TRACE_SAMPLE_RATIO.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        if parent is not None:
+            sampled = parent.sampled and tracer.exporter is not None
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            sampled = tracer.should_sample()
+            trace_id, parent_id = _new_id(128), None
+
+        if not sampled:
+            # Still propagate the trace downstream, flagged as not sampled
+            token = _current.set(SpanContext(trace_id, _new_id(64), False))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _current.reset(token)
+            return
+
+        server_span = Span(
+            scope["method"],
+            SpanContext(trace_id, _new_id(64), True),
+            parent_id,
+            {"http.method": scope["method"], "http.target": scope["path"]},
+        )
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                server_span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    server_span.status = "error"
+            await send(message)
+
+        token = _current.set(server_span.context)
+        error = None
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current.reset(token)
+            route = scope.get("metrics_route")
+            if route is None:
+                matched = scope.get("route")
+                route = matched.path if matched is not None else None
+            if route is not None:
+                server_span.name = f"{scope['method']} {route}"
+                server_span.set_attribute("http.route", route)
+            server_span.end(error)
+
+
+def install(app: FastAPI, service: str):
+    """Add the tracing middleware to an app and name the service on its spans"""
+    tracer.service = os.getenv("SERVICE_NAME", service)
+    app.add_middleware(TracingMiddleware)
+
+    @app.on_event("shutdown")
+    async def close_trace_exporter():
+        if tracer.exporter is not None:
+            tracer.exporter.close()
+
+
+def _operation(statement: str) -> str:
+    verb = statement.lstrip()[:6].upper()
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def instrument_engine(engine):
+    """Record a span for every SQL statement executed within a sampled trace"""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if is_recording():
+            context._trace_span = span(
+                f"sql {_operation(statement)}",
+                **{"db.system": sync_engine.dialect.name, "db.statement": statement[:TRACE_SQL_MAX_LENGTH]},
+            )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        sql_span = getattr(context, "_trace_span", None)
+        if sql_span is not None:
+            context._trace_span = None
+            sql_span.end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        sql_span = getattr(context, "_trace_span", None) if context is not None else None
+        if sql_span is not None:
+            context._trace_span = None
+            sql_span.end(exception_context.original_exception)